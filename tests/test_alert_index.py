@@ -0,0 +1,41 @@
+import random
+
+from try_pipelining.alert_index import AhoCorasick, AlertMatchingIndex
+
+
+def brute_force_match(configs, unique_id):
+    matched = []
+    for config_data in configs:
+        matching_reqs = config_data["alert_matching"]
+        for alert_type in matching_reqs:
+            req_keys = matching_reqs[alert_type]["required_keys"]
+            if all([key in unique_id for key in req_keys]):
+                matched.append(config_data)
+    return matched
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers", "BAT", ""])
+    assert automaton.find("ushers") == {"she", "he", "hers", ""}
+    assert automaton.find("SWIFT#BAT_GRB") == {"BAT", ""}
+
+
+def test_index_matches_brute_force():
+    rng = random.Random(5)
+    words = ["SWIFT", "BAT", "GRB", "Pos", "Fermi", "GBM", "ivo", "#", "_", "LVC"]
+
+    configs = []
+    for i in range(60):
+        alert_matching = {
+            f"type_{i}_{j}": {
+                "required_keys": rng.sample(words, rng.randint(0, 3))
+                + rng.choice([[], ["SWIFT"]])
+            }
+            for j in range(rng.randint(1, 3))
+        }
+        configs.append({"alert_matching": alert_matching, "id": i})
+
+    index = AlertMatchingIndex(configs)
+    for _ in range(200):
+        unique_id = "".join(rng.choice(words) for _ in range(rng.randint(0, 6)))
+        assert index.match(unique_id) == brute_force_match(configs, unique_id)
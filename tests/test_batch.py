@@ -0,0 +1,55 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+import pytest
+
+from try_pipelining.batch import process_chunks, read_alerts, run_batch
+
+from tests.test_pipeline import alert_dict
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_batch_writes_all_records(tmp_path, ordered: bool):
+    alerts = [
+        dict(alert_dict, unique_id=f"{alert_dict['unique_id']}-{i}") for i in range(3)
+    ]
+    alerts.insert(1, {"unique_id": "broken"})
+    alert_file = tmp_path / "alerts.jsonl"
+    alert_file.write_text(
+        "\n".join(json.dumps(alert, default=str) for alert in alerts) + "\n"
+    )
+
+    output_file = tmp_path / "results.jsonl"
+    summary = run_batch(
+        read_alerts(str(alert_file)),
+        "configs",
+        str(output_file),
+        workers=2,
+        chunk_size=2,
+        ordered=ordered,
+    )
+    assert summary.n_alerts == 4
+    assert summary.n_errors == 1
+    assert summary.alerts_per_s > 0
+
+    records = [json.loads(line) for line in output_file.read_text().splitlines()]
+    ids = [r["unique_id"] for r in records]
+    expected_ids = [a["unique_id"] for a in alerts]
+    assert ids == expected_ids if ordered else sorted(ids) == sorted(expected_ids)
+    assert all(r["pipelines"][0]["passed"] for r in records if "error" not in r)
+
+
+def test_chunks_are_streamed():
+    pulled = count()
+
+    def endless_chunks():
+        for i in pulled:
+            yield [{"unique_id": f"broken-{i}"}]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        records = process_chunks(executor, endless_chunks(), "configs", max_pending=4)
+        for _ in range(10):
+            assert "error" in next(records)[0]
+        # never more than max_pending chunks read ahead
+        assert next(pulled) <= 10 + 4
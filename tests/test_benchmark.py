@@ -0,0 +1,28 @@
+import yaml
+
+from try_pipelining.benchmark import (
+    compare_results,
+    reference_pipeline_cfg,
+    run_benchmarks,
+)
+
+
+def test_benchmark_run_and_compare():
+    base = run_benchmarks(repeat=1, selection="match_science_configs")
+    assert set(base["results"]) == {
+        f"match_science_configs[n_configs={n}]" for n in (1, 10, 100)
+    }
+
+    slower = {
+        "results": {
+            key: dict(timing, median_s=timing["median_s"] * 1.5)
+            for key, timing in base["results"].items()
+        }
+    }
+    assert all(entry["regression"] for entry in compare_results(base, slower))
+    assert not any(entry["regression"] for entry in compare_results(slower, base))
+
+
+def test_reference_config_is_shipped_with_the_package():
+    with open("configs/pipeline_config.yaml") as config_file:
+        assert reference_pipeline_cfg() == yaml.safe_load(config_file)["pipeline"]
@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import pytest
+
+from try_pipelining.config_repository import ConfigRepository
+from try_pipelining.data_models import ScienceAlert
+
+from tests.test_pipeline import alert_dict
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    for cfg in ("pipeline_config.yaml", "pipeline_config_2.yaml"):
+        shutil.copy(os.path.join("configs", cfg), tmp_path / cfg)
+    return tmp_path
+
+
+def test_repository_reloads_only_changed_files(config_dir):
+    repository = ConfigRepository(str(config_dir))
+    assert repository.n_parsed == 2
+    assert len(repository.match(ScienceAlert(**alert_dict))) == 1
+
+    # touching without changing the content does not parse again
+    swift_cfg = config_dir / "pipeline_config.yaml"
+    os.utime(swift_cfg, ns=(0, 0))
+    repository.refresh()
+    assert repository.n_parsed == 2
+
+    # a changed file is parsed again, the other one is kept
+    fermi_cfg = config_dir / "pipeline_config_2.yaml"
+    fermi_data_before = repository.entries[str(fermi_cfg)].config_data
+    swift_cfg.write_text(
+        swift_cfg.read_text().replace('["SWIFT", "BAT_GRB_Pos"]', '["INTEGRAL"]')
+    )
+    repository.refresh()
+    assert repository.n_parsed == 3
+    assert repository.entries[str(fermi_cfg)].config_data is fermi_data_before
+    assert len(repository.match(ScienceAlert(**alert_dict))) == 0
+
+    # deleted files are forgotten
+    fermi_cfg.unlink()
+    repository.refresh()
+    assert len(repository.configs) == 1
+
+
+def test_repository_skips_invalid_configs(config_dir):
+    cfg = config_dir / "pipeline_config.yaml"
+    cfg.write_text(cfg.read_text().replace("fact_n: 25", "fact_n: twentyfive"))
+    repository = ConfigRepository(str(config_dir))
+    assert len(repository.configs) == 1
+    assert "fact_n" in repository.errors[str(cfg)].message
+
+
+def test_corrupted_config_keeps_the_last_good_version(config_dir):
+    repository = ConfigRepository(str(config_dir), refresh_interval_s=0.0)
+    science_alert = ScienceAlert(**alert_dict)
+    assert len(repository.match(science_alert)) == 1
+
+    # a half written file, while the repository is in use
+    swift_cfg = config_dir / "pipeline_config.yaml"
+    good_content = swift_cfg.read_text()
+    swift_cfg.write_text(good_content[: len(good_content) // 2] + "\n  - [")
+    for _ in range(2):
+        repository.refresh_if_due()
+        assert len(repository.match(science_alert)) == 1
+        assert str(swift_cfg) in repository.errors
+    assert repository.n_parsed == 2
+
+    swift_cfg.write_text(good_content.replace("fact_n: 25", "fact_n: 20"))
+    repository.refresh_if_due()
+    assert repository.errors == {}
+    assert repository.n_parsed == 3
+    assert len(repository.match(science_alert)) == 1
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import ephem
+import numpy as np
+import pytz
+from astropy import units as u
+from astropy.coordinates import AltAz, SkyCoord, get_sun
+from astropy.time import Time
+
+from try_pipelining.data_models import CTANorth, ObservationWindowOptions
+from try_pipelining.ephemeris import (
+    FAST_ALTAZ_TOLERANCE_DEG,
+    MJD_OFFSET,
+    MOON_ALT_TOLERANCE_DEG,
+    MOON_AZ_TOLERANCE_DEG,
+    MOON_PHASE_TOLERANCE_PERCENT,
+    source_alt_az,
+    sun_alt_az,
+)
+from try_pipelining.ephemeris_archive import build_ephemeris_archive
+from try_pipelining.observation_windows import calculate_moon_pars
+
+from tests.test_observation_windows import calculate_windows, make_alert, window_options
+
+
+def test_moon_pars_match_ephem():
+    site = CTANorth()
+    rng = np.random.default_rng(42)
+    start = datetime(2021, 1, 1)
+    test_dates = [
+        start + timedelta(days=float(d)) for d in rng.uniform(0, 3 * 365, 2000)
+    ]
+
+    moon = ephem.Moon()
+    obs = ephem.Observer()
+    obs.lon = str(site.lon / u.deg)
+    obs.lat = str(site.lat / u.deg)
+    obs.elev = site.height / u.m
+
+    ephem_alts, ephem_azs, ephem_phase = [], [], []
+    for test_date in test_dates:
+        obs.date = ephem.Date(test_date)
+        moon.compute(obs)
+        ephem_alts.append(moon.alt * 180.0 / np.pi)
+        ephem_azs.append(moon.az * 180.0 / np.pi)
+        ephem_phase.append(moon.phase)
+    ephem_alts = np.array(ephem_alts)
+
+    moon_alts, moon_azs, moon_phase = calculate_moon_pars(Time(test_dates).mjd, site)
+
+    assert np.max(np.abs(moon_alts - ephem_alts)) < MOON_ALT_TOLERANCE_DEG
+    az_diff = (moon_azs - np.array(ephem_azs) + 180.0) % 360.0 - 180.0
+    assert np.max(np.abs(az_diff[ephem_alts < 85])) < MOON_AZ_TOLERANCE_DEG
+    assert (
+        np.max(np.abs(moon_phase - np.array(ephem_phase)))
+        < MOON_PHASE_TOLERANCE_PERCENT
+    )
+
+
+def test_ephemeris_archive_matches_live_windows(tmp_path):
+    site = CTANorth()
+    alert = make_alert(
+        262.8109, 14.6481, datetime(2021, 2, 10, 2, 00, 27, 91, tzinfo=pytz.utc)
+    )
+    options = window_options
+
+    archive_path = str(tmp_path / "ctan.ephem")
+    archive = build_ephemeris_archive(
+        archive_path,
+        site,
+        start=datetime(2021, 2, 9, tzinfo=pytz.utc),
+        years=5 / 365.25,
+        cadence_minutes=5,
+    )
+    assert archive.matches_site(site)
+
+    live_windows = calculate_windows(alert, ObservationWindowOptions(**options), site)
+    archive_windows = calculate_windows(
+        alert,
+        ObservationWindowOptions(ephemeris_archive=archive_path, **options),
+        site,
+    )
+
+    assert len(live_windows) == len(archive_windows) == 3
+    precision = timedelta(minutes=options["precision_minutes"])
+    for live, archived in zip(live_windows, archive_windows):
+        assert abs(live.start_time - archived.start_time) <= precision
+        assert abs(live.end_time - archived.end_time) <= precision
+
+
+def test_fast_backend_within_documented_tolerance():
+    site = CTANorth()
+    lat, lon = site.lat.to_value(u.deg), site.lon.to_value(u.deg)
+    rng = np.random.default_rng(3)
+    mjds = rng.uniform(59215, 59215 + 5 * 365, 2000)
+    ras = rng.uniform(0, 360, 2000)
+    decs = np.degrees(np.arcsin(rng.uniform(-1, 1, 2000)))
+
+    altaz_frame = AltAz(obstime=Time(mjds, format="mjd"), location=site.location)
+    astropy_source_alts = SkyCoord(ras, decs, unit="deg").transform_to(altaz_frame)
+    astropy_sun_alts = get_sun(altaz_frame.obstime).transform_to(altaz_frame)
+
+    fast_source_alts, _ = source_alt_az(ras, decs, mjds + MJD_OFFSET, lat, lon)
+    fast_sun_alts, _ = sun_alt_az(mjds + MJD_OFFSET, lat, lon)
+
+    assert (
+        np.max(np.abs(fast_source_alts - astropy_source_alts.alt.deg))
+        < FAST_ALTAZ_TOLERANCE_DEG
+    )
+    assert (
+        np.max(np.abs(fast_sun_alts - astropy_sun_alts.alt.deg))
+        < FAST_ALTAZ_TOLERANCE_DEG
+    )
@@ -0,0 +1,32 @@
+import io
+import json
+
+from try_pipelining.data_models import CTANorth, ScienceAlert
+from try_pipelining.events import JsonlSink, ListSink, MultiSink
+from try_pipelining.pipelines import execute_pipeline_from_cfg, match_science_configs
+
+from tests.test_pipeline import alert_dict
+
+
+def test_headless_run_emits_events(capsys):
+    sci_alert = ScienceAlert(**alert_dict)
+    cfg = match_science_configs(sci_alert, "configs")[0]["pipeline"]
+    events = ListSink()
+    stream = io.StringIO()
+
+    results = execute_pipeline_from_cfg(
+        sci_alert, CTANorth(), cfg, sink=MultiSink(events, JsonlSink(stream))
+    )
+    assert capsys.readouterr().out == ""
+
+    kinds = [event.kind for event in events.events]
+    assert kinds[0] == "tasks_started" and kinds[-1] == "results"
+    assert {e.name for e in events.of_kind("task_finished")} == set(cfg["tasks"])
+    assert all(e.data["passed"] for e in events.of_kind("task_finished"))
+    assert [e.name for e in events.of_kind("post_action_done")] == list(
+        cfg["post_action"]
+    )
+    assert events.of_kind("results")[0].data["results"] is results
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["kind"] for line in lines] == kinds
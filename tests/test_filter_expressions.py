@@ -0,0 +1,101 @@
+import pytest
+from pydantic import ValidationError
+
+from try_pipelining.data_models import (
+    CTANorth,
+    ParameterFilterOptions,
+    ParameterOptions,
+    ScienceAlert,
+)
+from try_pipelining.filter_expressions import (
+    FilterExpressionError,
+    compile_filter_expression,
+)
+from try_pipelining.parameter import execute_parameter_filtering
+from try_pipelining.tasks import ParameterTask
+
+from tests.test_pipeline import alert_dict
+
+parameters = {"count_rate": 1.2e3, "system_stable": True, "noise": 5.2, "det": "BAT"}
+
+
+@pytest.mark.parametrize(
+    "expression, passed",
+    [
+        ("count_rate > 1e3 and system_stable == True and noise < 10.5", True),
+        ("count_rate > 1e4 or noise < 1", False),
+        ("not noise > 10", True),
+        ("system_stable", True),
+        ("1e3 < count_rate <= 1.2e3", True),
+        ("5.2 < noise < 10", False),
+        ("det in ['BAT', 'XRT'] and det not in ('GBM',)", True),
+        ("threshold > 1", False),
+        ("threshold", False),
+        ("not threshold > 10", False),
+        ("not threshold", False),
+        ("noise < 10 and not 1 < threshold < 2", False),
+        ("threshold > 1 or noise < 10", True),
+        ("noise < 10 or threshold > 1", True),
+        ("threshold > 1 or noise > 10", False),
+        ("noise > 10 or threshold > 1", False),
+        ("threshold > 1 and noise > 10", False),
+        ("noise > 10 and threshold > 1", False),
+        ("not (threshold > 1 or noise > 10)", False),
+        ("not (noise > 10 or threshold > 1)", False),
+        ("missing(threshold) and present(noise)", True),
+        ("missing(threshold) or threshold > 1", True),
+        ("not (present(threshold) and threshold > 10)", True),
+        ("noise >= -1", True),
+    ],
+)
+def test_filter_expressions(expression: str, passed: bool):
+    assert compile_filter_expression(expression)(parameters) is passed
+
+
+def test_missing_parameters_do_not_depend_on_operand_order():
+    parameters = {"count_rate": 10}
+    for expression in ("noise < 5 or count_rate > 1", "count_rate > 1 or noise < 5"):
+        assert compile_filter_expression(expression)(parameters)
+    for expression in ("noise < 5 and count_rate > 1", "count_rate > 1 and noise < 5"):
+        assert not compile_filter_expression(expression)(parameters)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["count_rate >", "noise + 1 > 2", "noise is None", "len(det) > 1", "a < [b]"],
+)
+def test_invalid_filter_expressions(expression: str):
+    with pytest.raises(FilterExpressionError):
+        compile_filter_expression(expression)
+
+
+def test_parameter_filter_options():
+    options = ParameterFilterOptions(expression="noise < 10.5 and system_stable")
+    assert execute_parameter_filtering(parameters, options)
+
+    legacy = ParameterFilterOptions(
+        parameter_name="noise",
+        parameter_requirement=10.5,
+        parameter_comparison="less",
+    )
+    assert execute_parameter_filtering(parameters, legacy)
+
+    # expressions are checked when the configuration is loaded
+    with pytest.raises(ValidationError):
+        ParameterFilterOptions(expression="noise <")
+    with pytest.raises(ValidationError):
+        ParameterFilterOptions(parameter_name="noise")
+
+
+def test_incomparable_values_raise_a_filter_error():
+    evaluate = compile_filter_expression("det > 1")
+    with pytest.raises(FilterExpressionError, match="det > 1"):
+        evaluate(parameters)
+
+    sci_alert = ScienceAlert(**alert_dict)
+    options = ParameterFilterOptions(expression="system_stable > 'yes'")
+    task = ParameterTask(
+        sci_alert, CTANorth(), "Stable", "ParameterTask", ParameterOptions(), options
+    )
+    result = task.filter(task.run())
+    assert not task.passed and not result.parameter_ok
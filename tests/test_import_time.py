@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+# modules that must not be loaded by the pipeline entry points, in a fresh
+# interpreter. The import time is only reported, it depends on the machine.
+HEAVY_MODULES = ("astropy", "ephem", "matplotlib", "numpy")
+
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import try_pipelining.pipelines
+import_s = time.perf_counter() - start
+heavy_after_import = [m for m in %r if m in sys.modules]
+
+from try_pipelining.data_models import CTANorth, ScienceAlert
+from try_pipelining.pipelines import parse_tasks, run_pipeline
+from tests.test_pipeline import alert_dict
+
+tasks_cfg = {
+    "CountRate": {
+        "task_type": "ParameterTask",
+        "filter_options": {
+            "parameter_name": "count_rate",
+            "parameter_requirement": 1.0e3,
+            "parameter_comparison": "greater",
+        },
+    }
+}
+sci_alert = ScienceAlert(**alert_dict)
+tasks = parse_tasks(sci_alert, CTANorth(), tasks_cfg)
+assert run_pipeline(tasks, "CountRate", []) is not None
+
+heavy = [m for m in %r if m in sys.modules]
+print(json.dumps({"import_s": import_s, "heavy": heavy_after_import + heavy}))
+""" % (
+    HEAVY_MODULES,
+    HEAVY_MODULES,
+)
+
+
+def cold_start():
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_parameter_pipelines_stay_light():
+    run = cold_start()
+    print(f"import try_pipelining.pipelines: {run['import_s']:.3f} s")
+    assert run["heavy"] == []
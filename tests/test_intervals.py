@@ -0,0 +1,33 @@
+import numpy as np
+
+from try_pipelining.intervals import IntervalSet, intersection
+
+
+def test_from_mask_does_not_bridge_gaps():
+    times = np.arange(10.0)
+    mask = np.array([0, 1, 1, 0, 0, 1, 1, 1, 0, 1], dtype=bool)
+
+    intervals = IntervalSet.from_mask(times, mask)
+    assert list(intervals) == [(1.0, 2.0), (5.0, 7.0), (9.0, 9.0)]
+
+    # runs are split where the segment (night) changes
+    segments = np.array([0, 0, 0, 0, 0, 0, 1, 1, 1, 1])
+    intervals = IntervalSet.from_mask(times, mask, segments)
+    assert list(intervals) == [(1.0, 2.0), (5.0, 5.0), (6.0, 7.0), (9.0, 9.0)]
+
+
+def test_interval_algebra():
+    a = IntervalSet([0.0, 5.0, 10.0], [3.0, 8.0, 12.0])
+    b = IntervalSet([2.0, 7.0], [6.0, 11.0])
+
+    assert list(a.intersection(b)) == [(2.0, 3.0), (5.0, 6.0), (7.0, 8.0), (10.0, 11.0)]
+    assert list(a.union(b)) == [(0.0, 12.0)]
+    assert intersection(a, b, IntervalSet([0.0], [5.5])) == IntervalSet(
+        [2.0, 5.0], [3.0, 5.5]
+    )
+    assert list(a.filter_min_duration(2.5)) == [(0.0, 3.0), (5.0, 8.0)]
+    assert list(IntervalSet.from_unsorted([4.0, 0.0, 1.0], [5.0, 2.0, 3.0])) == [
+        (0.0, 3.0),
+        (4.0, 5.0),
+    ]
+    assert len(a.intersection(IntervalSet())) == 0
@@ -0,0 +1,90 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from try_pipelining.data_models import CTANorth, ScienceAlert
+from try_pipelining.events import NullSink
+from try_pipelining.metrics import MetricsRegistry, enable_metrics, registry
+from try_pipelining.pipelines import execute_pipeline_from_cfg, match_science_configs
+from try_pipelining.task_cache import task_result_cache
+
+from tests.test_pipeline import alert_dict
+
+
+def test_registry_exports():
+    metrics = MetricsRegistry()
+    metrics.inc("alerts_total")
+    assert metrics.counters == {}
+
+    metrics.enabled = True
+    metrics.inc("alerts_total", 2, source="gcn")
+    with metrics.timer("stage", stage="a"):
+        pass
+
+    assert metrics.value("alerts_total", source="gcn") == 2
+    assert metrics.value("stage_calls_total", stage="a") == 1
+    assert metrics.value("stage_wall_seconds_total", stage="a") >= 0
+
+    text = metrics.to_prometheus()
+    assert "# TYPE try_pipelining_alerts_total counter" in text
+    assert 'try_pipelining_alerts_total{source="gcn"} 2.0' in text
+    assert json.loads(metrics.to_json())["alerts_total"] == [
+        {"labels": {"source": "gcn"}, "value": 2.0}
+    ]
+
+
+def test_pipeline_stages_are_timed():
+    sci_alert = ScienceAlert(**alert_dict)
+    cfg = dict(match_science_configs(sci_alert, "configs")[0]["pipeline"])
+    cfg["execution"] = {"mode": "sequential"}
+    task_result_cache.clear()
+
+    registry.reset()
+    enable_metrics()
+    try:
+        execute_pipeline_from_cfg(sci_alert, CTANorth(), cfg, sink=NullSink())
+    finally:
+        enable_metrics(False)
+
+    for task_name in cfg["tasks"]:
+        assert registry.value("task_calls_total", task=task_name) == 1
+        assert registry.value("task_outcomes_total", task=task_name, passed="true")
+    for action in cfg["post_action"]:
+        assert registry.value("post_action_calls_total", action=action) == 1
+    for stage in ("setup_nights", "compute_night_intervals", "calculate_moon_pars"):
+        assert registry.value("observation_window_stage_calls_total", stage=stage)
+    assert registry.value("nights_evaluated_total") >= 1
+    assert registry.value("samples_processed_total") > 100
+    registry.reset()
+
+
+def test_process_pool_task_metrics_reach_the_parent_registry():
+    sci_alert = ScienceAlert(**alert_dict)
+    cfg = dict(match_science_configs(sci_alert, "configs")[0]["pipeline"])
+    cfg["execution"] = {"mode": "process", "max_workers": 2}
+    task_result_cache.clear()
+
+    registry.reset()
+    enable_metrics()
+    try:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            execute_pipeline_from_cfg(sci_alert, CTANorth(), cfg, executor, NullSink())
+    finally:
+        enable_metrics(False)
+
+    for task_name in cfg["tasks"]:
+        assert registry.value("task_calls_total", task=task_name) == 1
+        assert registry.value("task_wall_seconds_total", task=task_name) > 0
+        assert registry.value("task_outcomes_total", task=task_name, passed="true")
+    for stage in ("setup_nights", "compute_night_intervals"):
+        assert registry.value("observation_window_stage_calls_total", stage=stage)
+    assert registry.value("samples_processed_total") > 100
+    registry.reset()
+
+
+def test_prometheus_label_values_are_escaped():
+    metrics = MetricsRegistry(enabled=True)
+    metrics.inc("task_calls_total", task='a\\b "quoted"\nnext')
+    assert (
+        'try_pipelining_task_calls_total{task="a\\\\b \\"quoted\\"\\nnext"} 1.0'
+        in metrics.to_prometheus().splitlines()
+    )
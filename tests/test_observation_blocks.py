@@ -0,0 +1,47 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from try_pipelining.data_models import ObservationBlock
+from try_pipelining.events import json_default
+from try_pipelining.observation_blocks import ObservationBlockBatch
+
+start = datetime(2021, 2, 12, 2, 34, 3, 787472, tzinfo=timezone.utc)
+blocks = [
+    ObservationBlock(
+        start_time=start + timedelta(minutes=15 * i),
+        end_time=start + timedelta(minutes=15 * (i + 1)),
+        ra_target_deg=262.0 + i,
+        dec_target_deg=14.0 - i,
+    )
+    for i in range(5)
+]
+
+
+def test_batch_materializes_observation_blocks():
+    batch = ObservationBlockBatch.from_blocks(blocks)
+    assert len(batch) == 5
+    assert list(batch) == blocks
+    assert batch == blocks
+    assert batch[0] == blocks[0]
+    assert batch[-1] == blocks[-1]
+    assert isinstance(batch[1:3], ObservationBlockBatch)
+    assert list(batch[1:3]) == blocks[1:3]
+    assert batch.to_records() == [ob.dict() for ob in blocks]
+
+
+def test_batch_json_export():
+    batch = ObservationBlockBatch.from_blocks(blocks)
+    assert json.loads(json.dumps({"obs": batch}, default=json_default)) == json.loads(
+        json.dumps({"obs": blocks}, default=json_default)
+    )
+
+
+def test_batch_validates_columns_in_bulk():
+    with pytest.raises(ValueError, match="ra_target_deg"):
+        ObservationBlockBatch(
+            [start.replace(tzinfo=None)], [start.replace(tzinfo=None)], [361.0], [1.0]
+        )
+    with pytest.raises(ValueError, match="same length"):
+        ObservationBlockBatch([], [], [1.0], [1.0])
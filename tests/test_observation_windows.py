@@ -0,0 +1,273 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import ephem
+import numpy as np
+import pytest
+import pytz
+from astropy import units as u
+
+from try_pipelining.data_models import (
+    CTANorth,
+    ObservationWindowOptions,
+    ScienceAlert,
+)
+from try_pipelining.night_index import NightIndex
+from try_pipelining.observation_windows import (
+    calculate_observation_windows,
+    calculate_observation_windows_adaptive,
+    calculate_observation_windows_batch,
+    setup_night_timerange,
+    setup_nights,
+)
+
+window_options = {
+    "max_zenith_deg": 60,
+    "search_range_hours": 48,
+    "precision_minutes": 2,
+    "min_delay_minutes": 0,
+    "max_delay_minutes": 1440,
+    "min_duration_minutes": 15,
+}
+
+
+def make_alert(ra, dec, alert_time):
+    return ScienceAlert(
+        unique_id="ivo://nasa.gcn.gov/SWIFT#BAT_GRB_Pos#1234567-1337",
+        coords={"raInDeg": ra, "decInDeg": dec},
+        alert_time=alert_time,
+        measured_parameters={},
+    )
+
+
+def reference_nights(site, start, search_range_hours):
+    """the night search as it was done with one ephem.Observer per night."""
+    sun = ephem.Sun()
+    obs = ephem.Observer()
+    obs.lon = str(site.lon / u.deg)
+    obs.lat = str(site.lat / u.deg)
+    obs.elev = site.height / u.m
+
+    end = start.replace(tzinfo=None)
+    max_time = end + timedelta(hours=search_range_hours)
+    nights = []
+    while end < max_time:
+        obs.date = end
+        sun_set = obs.next_setting(sun, use_center=True).datetime()
+        sun_rise = obs.next_rising(sun, use_center=True).datetime()
+        if sun_set > sun_rise:
+            sun_set = obs.previous_setting(sun, use_center=True).datetime()
+        if sun_set > max_time:
+            break
+        nights.append((sun_set, sun_rise))
+        end = sun_rise
+    return nights
+
+
+def test_night_index_matches_reference():
+    site = CTANorth()
+    rng = np.random.default_rng(7)
+    start = datetime(2021, 1, 1, tzinfo=pytz.utc)
+    for days, hours in zip(rng.uniform(0, 730, 50), rng.uniform(1, 120, 50)):
+        alert_time = start + timedelta(days=float(days))
+        options = ObservationWindowOptions(
+            **{**window_options, "search_range_hours": float(hours)}
+        )
+        nights = setup_nights(make_alert(10.0, 10.0, alert_time), options, site)
+        expected = reference_nights(site, alert_time, hours)
+
+        assert len(nights) == len(expected)
+        for night, (sun_set, sun_rise) in zip(nights, expected):
+            sun_set = sun_set.replace(tzinfo=timezone.utc)
+            sun_rise = sun_rise.replace(tzinfo=timezone.utc)
+            assert abs(night.sun_set - sun_set) < timedelta(seconds=1)
+            assert abs(night.sun_rise - sun_rise) < timedelta(seconds=1)
+
+
+def test_night_index_prepends_earlier_nights_concurrently():
+    site = CTANorth()
+    index = NightIndex(site.lat_deg, site.lon_deg, site.height_m, block=8)
+    start = datetime(2021, 6, 1, tzinfo=timezone.utc)
+    later = index.nights_between(start, start + timedelta(days=3))
+
+    rng = np.random.default_rng(3)
+    offsets = rng.uniform(-400, 0, 40)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        nights = list(
+            executor.map(
+                lambda days: index.night_of(start + timedelta(days=float(days))),
+                offsets,
+            )
+        )
+
+    for days, (sun_set, sun_rise) in zip(offsets, nights):
+        assert sun_set < sun_rise < sun_set + timedelta(hours=16)
+        assert start + timedelta(days=float(days)) < sun_rise
+    # earlier nights were added in front, the index was never rebuilt
+    assert index.nights_between(start, start + timedelta(days=3)) == later
+    assert all(a < b for a, b in zip(index.sun_rises, index.sun_sets[1:]))
+    assert all(a < b for a, b in zip(index.sun_sets, index.sun_rises))
+    fresh = NightIndex(site.lat_deg, site.lon_deg, site.height_m)
+    for sun_set, sun_rise in nights[:5]:
+        expected = fresh.night_of(sun_set - timedelta(hours=1))
+        assert abs(expected[0] - sun_set) < timedelta(seconds=1)
+        assert abs(expected[1] - sun_rise) < timedelta(seconds=1)
+
+
+def calculate_windows(alert, options, site):
+    nights = setup_nights(alert, options, site)
+    testable_dates_nightlist = [
+        setup_night_timerange(night, options) for night in nights
+    ]
+    return calculate_observation_windows(alert, options, site, testable_dates_nightlist)
+
+
+def test_batch_windows_match_single_alert_windows():
+    site = CTANorth()
+    options = ObservationWindowOptions(**window_options)
+    alerts = [
+        make_alert(262.8109, 14.6481, datetime(2021, 2, 10, 2, 0, 27, tzinfo=pytz.utc)),
+        make_alert(10.0, 40.0, datetime(2021, 2, 10, 12, 0, tzinfo=pytz.utc)),
+        make_alert(100.0, 5.0, datetime(2021, 2, 11, 22, 0, tzinfo=pytz.utc)),
+        make_alert(200.0, 60.0, datetime(2021, 2, 9, 0, 0, tzinfo=pytz.utc)),
+        make_alert(350.0, 80.0, datetime(2021, 2, 12, 3, 0, tzinfo=pytz.utc)),
+    ]
+
+    batch_windows = calculate_observation_windows_batch(
+        alerts, options, site, chunk_size=2
+    )
+
+    assert len(batch_windows) == len(alerts)
+    for alert, windows in zip(alerts, batch_windows):
+        assert windows == calculate_windows(alert, options, site)
+
+
+def test_batch_grids_only_cover_the_nights_of_the_alerts(monkeypatch):
+    from try_pipelining import observation_windows
+
+    site = CTANorth()
+    options = ObservationWindowOptions(**window_options)
+    start = datetime(2021, 1, 5, 21, 0, tzinfo=pytz.utc)
+    # two close alerts and alerts months apart, as in an archive
+    alerts = [
+        make_alert(100.0, 20.0 + 5 * i, start + timedelta(days=days))
+        for i, days in enumerate([150, 0, 0.5, 60, 300, 30])
+    ]
+
+    groups = []
+    shared_grid = observation_windows.observation_windows_shared_grid
+
+    def recording_shared_grid(science_alerts, options, site):
+        groups.append(science_alerts)
+        return shared_grid(science_alerts, options, site)
+
+    monkeypatch.setattr(
+        observation_windows, "observation_windows_shared_grid", recording_shared_grid
+    )
+    batch_windows = calculate_observation_windows_batch(alerts, options, site)
+
+    # one grid per group of close alerts, never one grid over all months
+    assert sorted(len(group) for group in groups) == [1, 1, 1, 1, 2]
+    for group in groups:
+        span = group[-1].alert_time - group[0].alert_time
+        assert span <= timedelta(hours=options.search_range_hours)
+    for alert, windows in zip(alerts, batch_windows):
+        assert windows == calculate_windows(alert, options, site)
+
+
+@pytest.mark.parametrize("precision_minutes", [2, 0.5])
+def test_adaptive_windows_match_uniform_windows(precision_minutes):
+    site = CTANorth()
+    uniform_options = ObservationWindowOptions(
+        **{**window_options, "precision_minutes": precision_minutes}
+    )
+    adaptive_options = ObservationWindowOptions(
+        **{
+            **window_options,
+            "precision_minutes": precision_minutes,
+            "search_mode": "adaptive",
+        }
+    )
+    # the uniform grid spacing is slightly larger than precision_minutes
+    tolerance = timedelta(minutes=precision_minutes * 1.05)
+
+    alerts = [
+        make_alert(262.8109, 14.6481, datetime(2021, 2, 10, 2, 0, 27, tzinfo=pytz.utc)),
+        make_alert(10.0, 40.0, datetime(2021, 9, 3, 12, 0, tzinfo=pytz.utc)),
+        make_alert(100.0, 5.0, datetime(2022, 1, 20, 22, 0, tzinfo=pytz.utc)),
+    ]
+    for alert in alerts:
+        nights = setup_nights(alert, uniform_options, site)
+        uniform = calculate_windows(alert, uniform_options, site)
+        adaptive = calculate_observation_windows_adaptive(
+            alert, adaptive_options, site, nights
+        )
+
+        assert len(uniform) == len(adaptive) > 0
+        for uniform_window, adaptive_window in zip(uniform, adaptive):
+            assert abs(uniform_window.start_time - adaptive_window.start_time) < (
+                tolerance
+            )
+            assert abs(uniform_window.end_time - adaptive_window.end_time) < tolerance
+
+
+def test_invalid_search_mode():
+    with pytest.raises(ValueError):
+        ObservationWindowOptions(**{**window_options, "search_mode": "random"})
+
+
+def test_moon_constraints_only_shrink_windows():
+    site = CTANorth()
+    # full moon night, the moon is allowed above the horizon
+    alert = make_alert(10.0, 40.0, datetime(2021, 9, 20, 12, 0, tzinfo=pytz.utc))
+    moonlit = {**window_options, "max_moon_altitude_deg": 90}
+    unconstrained = calculate_windows(alert, ObservationWindowOptions(**moonlit), site)
+    constrained = calculate_windows(
+        alert,
+        ObservationWindowOptions(
+            **moonlit, min_moon_separation_deg=30, max_moon_phase_percent=99
+        ),
+        site,
+    )
+
+    assert len(unconstrained) > 0
+    assert sum(w.duration_hours for w in constrained) < sum(
+        w.duration_hours for w in unconstrained
+    )
+    for window in constrained:
+        assert window.duration_hours * 60 >= window_options["min_duration_minutes"]
+        assert any(
+            w.start_time <= window.start_time and window.end_time <= w.end_time
+            for w in unconstrained
+        )
+
+
+def test_moon_is_computed_once_per_grid(monkeypatch):
+    from try_pipelining import observation_windows
+
+    calls = []
+    moon_alt_az_phase = observation_windows.moon_alt_az_phase
+
+    def counting_moon_alt_az_phase(*args):
+        calls.append(args)
+        return moon_alt_az_phase(*args)
+
+    monkeypatch.setattr(
+        observation_windows, "moon_alt_az_phase", counting_moon_alt_az_phase
+    )
+    site = CTANorth()
+    options = ObservationWindowOptions(
+        **window_options, min_moon_separation_deg=30, max_moon_phase_percent=99
+    )
+    alerts = [
+        make_alert(10.0, 40.0, datetime(2021, 9, 20, 12, 0, tzinfo=pytz.utc)),
+        make_alert(50.0, 20.0, datetime(2021, 9, 20, 18, 0, tzinfo=pytz.utc)),
+    ]
+
+    single = calculate_windows(alerts[0], options, site)
+    assert len(calls) == 1
+
+    calls.clear()
+    batch = calculate_observation_windows_batch(alerts, options, site)
+    assert len(calls) == 1
+    assert batch[0] == single
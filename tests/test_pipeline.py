@@ -4,16 +4,20 @@ from pydantic.typing import NoneType
 import yaml
 import pytest
 import pytz
+from pydantic import ValidationError
 from rich import print
 from yaml.loader import SafeLoader
 
 from try_pipelining.data_models import (
     CTANorth,
+    ExecutionOptions,
     ScienceAlert,
     SchedulingBlock,
     ObservationBlock,
     ParameterOptions,
     ParameterFilterOptions,
+    build_model,
+    trusted_internal_data,
 )
 from try_pipelining.pipelines import (
     run_pipeline,
@@ -21,8 +25,11 @@ from try_pipelining.pipelines import (
     parse_post_actions,
     match_science_configs,
     execute_pipeline_from_cfg,
+    shared_executor,
 )
 
+from try_pipelining import task_cache
+from try_pipelining.events import ListSink
 from try_pipelining.tasks import Task
 
 from try_pipelining.post_actions import Wobble, PostAction
@@ -193,3 +200,114 @@ def test_tasks_and_actions():
         nt.run()
     with pytest.raises(NotImplementedError):
         nt.filter(result={})
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_concurrent_execution(mode: str):
+    sci_alert = ScienceAlert(**alert_dict)
+    site = CTANorth()
+    cfg = match_science_configs(sci_alert, "configs")[0]
+
+    pipeline_cfg = dict(cfg["pipeline"], execution={"mode": "sequential"})
+    expected = execute_pipeline_from_cfg(sci_alert, site, pipeline_cfg)
+
+    pipeline_cfg["execution"] = {"mode": mode, "max_workers": 2}
+    results = execute_pipeline_from_cfg(sci_alert, site, pipeline_cfg)
+    # one pool per process and execution options, not one per run
+    options = ExecutionOptions(**pipeline_cfg["execution"])
+    assert shared_executor(options) is shared_executor(options) is not None
+    assert results.keys() == expected.keys()
+    assert (
+        results["CreateWobbleSchedulingBlock"]
+        == expected["CreateWobbleSchedulingBlock"]
+    )
+
+    with pytest.raises(ValueError):
+        execute_pipeline_from_cfg(
+            sci_alert, site, dict(pipeline_cfg, execution={"mode": "fibers"})
+        )
+
+
+def test_early_abort_skips_expensive_tasks(monkeypatch):
+    from try_pipelining.tasks import ObservationWindowTask
+
+    def must_not_run(self):
+        raise AssertionError("should have been skipped.")
+
+    monkeypatch.setattr(ObservationWindowTask, "run", must_not_run)
+    task_cache.task_result_cache.clear()
+
+    parameters = dict(alert_dict["measured_parameters"], system_stable=False)
+    failing_alert = dict(alert_dict, measured_parameters=parameters)
+    sci_alert = ScienceAlert(**failing_alert)
+    cfg = match_science_configs(sci_alert, "configs")[0]["pipeline"]
+    tasks = parse_tasks(sci_alert, CTANorth(), cfg["tasks"])
+    post_actions = parse_post_actions(sci_alert, cfg["post_action"])
+
+    result = run_pipeline(tasks, cfg["final_result_from"], post_actions)
+    assert result is None
+
+    with pytest.raises(AssertionError):
+        run_pipeline(tasks, cfg["final_result_from"], post_actions, early_abort=False)
+
+
+@pytest.mark.parametrize("mode", ["sequential", "process"])
+def test_trusted_internal_data(mode: str):
+    sci_alert = ScienceAlert(**alert_dict)
+    site = CTANorth()
+    cfg = match_science_configs(sci_alert, "configs")[0]
+    task_cache.task_result_cache.clear()
+
+    pipeline_cfg = dict(cfg["pipeline"], execution={"mode": mode})
+    expected = execute_pipeline_from_cfg(sci_alert, site, pipeline_cfg)
+
+    task_cache.task_result_cache.clear()
+    pipeline_cfg["execution"] = {"mode": mode, "trusted_internal_data": True}
+    results = execute_pipeline_from_cfg(sci_alert, site, pipeline_cfg)
+    assert results.keys() == expected.keys()
+    for name in results:
+        assert results[name] == expected[name]
+
+    # only results are trusted, the alert and the configuration still are validated
+    invalid_alert = dict(alert_dict, coords={"raInDeg": -1, "decInDeg": 0})
+    with pytest.raises(ValidationError):
+        execute_pipeline_from_cfg(invalid_alert, site, pipeline_cfg)
+    tasks_cfg = dict(pipeline_cfg["tasks"])
+    tasks_cfg["Factorials"] = dict(tasks_cfg["Factorials"], task_options={})
+    with pytest.raises(ValidationError):
+        execute_pipeline_from_cfg(sci_alert, site, dict(pipeline_cfg, tasks=tasks_cfg))
+    with trusted_internal_data():
+        assert build_model(ObservationBlock, ra_target_deg=-1).ra_target_deg == -1
+    with pytest.raises(ValidationError):
+        build_model(ObservationBlock, ra_target_deg=-1)
+
+
+def test_expensive_tasks_wait_for_cheap_filters_in_thread_mode(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from try_pipelining import pipelines
+    from try_pipelining.tasks import ObservationWindowTask
+
+    def must_not_run(self):
+        raise AssertionError("should have been held back.")
+
+    monkeypatch.setattr(ObservationWindowTask, "run", must_not_run)
+    monkeypatch.setattr(pipelines, "_measured_task_costs", {})
+    task_cache.task_result_cache.clear()
+
+    parameters = dict(alert_dict["measured_parameters"], system_stable=False)
+    sci_alert = ScienceAlert(**dict(alert_dict, measured_parameters=parameters))
+    cfg = match_science_configs(sci_alert, "configs")[0]["pipeline"]
+    tasks = parse_tasks(sci_alert, CTANorth(), cfg["tasks"])
+    post_actions = parse_post_actions(sci_alert, cfg["post_action"])
+
+    sink = ListSink()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(5):
+            result = run_pipeline(
+                tasks, cfg["final_result_from"], post_actions, executor, sink=sink
+            )
+            assert result is None
+
+    started = {event.name for event in sink.of_kind("task_started")}
+    assert "ObservationWindow" not in started and "SystemStable" in started
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+from itertools import cycle
+
+import pytest
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+
+from try_pipelining.data_models import ScienceAlert, SchedulingBlock
+from try_pipelining.post_actions import (
+    CreateObservationBlocks,
+    CreateObservationBlocksOptions,
+)
+
+from tests.test_pipeline import alert_dict
+
+
+@pytest.mark.parametrize(
+    "offsets, angles",
+    [([0.7, 0.7, 0.7, 0.7], [0, 90, 180, 270]), ([0.5, 1.0], [0, 120, 240])],
+)
+def test_wobble_positions_cycle_like_the_pattern(offsets, angles):
+    start = datetime(2021, 2, 12, 2, 34, 3, 787472, tzinfo=timezone.utc)
+    sb = SchedulingBlock(
+        coords={"raInDeg": 262.8109, "decInDeg": 14.6481},
+        time_constraints={"start_time": start, "end_time": start + timedelta(hours=6)},
+        wobble_options={"offsets": offsets, "angles": angles},
+    )
+    options = CreateObservationBlocksOptions(
+        min_block_duration_minutes=15.0, max_block_duration_minutes=30.0
+    )
+    post_action = CreateObservationBlocks(
+        ScienceAlert(**alert_dict), "CreateObservationBlocks", options
+    )
+    obs = post_action.run(task_result=sb)
+    assert len(obs) == 24
+
+    base = SkyCoord(ra=262.8109 * u.deg, dec=14.6481 * u.deg, frame="fk5")
+    for i, (ob, offset, angle) in enumerate(zip(obs, cycle(offsets), cycle(angles))):
+        expected = base.directional_offset_by(angle * u.deg, offset * u.deg)
+        assert ob.ra_target_deg == pytest.approx(expected.ra.deg, abs=1e-9)
+        assert ob.dec_target_deg == pytest.approx(expected.dec.deg, abs=1e-9)
+        assert ob.start_time == start + timedelta(minutes=15 * i)
+        assert ob.end_time == start + timedelta(minutes=15 * (i + 1))
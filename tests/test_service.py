@@ -0,0 +1,41 @@
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from try_pipelining.service import AlertService, run_service
+
+from tests.test_pipeline import alert_dict
+
+
+def test_service_processes_alert_stream(tmp_path):
+    unmatched = dict(alert_dict, unique_id="ivo://unknown#1")
+    alert_lines = [
+        json.dumps(alert_dict, default=str),
+        "not json",
+        json.dumps(unmatched, default=str),
+        json.dumps({"unique_id": "broken"}),
+    ]
+    alert_file = tmp_path / "alerts.jsonl"
+    alert_file.write_text("\n".join(alert_lines) + "\n")
+
+    output = io.StringIO()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        service = AlertService(
+            "configs", output, executor=executor, max_in_flight=2, queue_size=1
+        )
+        asyncio.run(run_service(service, service.read_jsonl(str(alert_file))))
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(records) == 4
+    by_id = {record.get("unique_id"): record for record in records}
+
+    matched = by_id[alert_dict["unique_id"]]
+    assert len(matched["pipelines"]) == 1
+    assert matched["pipelines"][0]["passed"]
+    assert "CreateObservationBlocks" in matched["pipelines"][0]["results"]
+    assert matched["total_s"] >= matched["queued_s"] >= 0
+
+    assert by_id[unmatched["unique_id"]]["pipelines"] == []
+    assert "error" in by_id["broken"]
+    assert "error" in by_id[None]
@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+import pytest
+
+from try_pipelining import window_store
+from try_pipelining.data_models import CTANorth, ScienceAlert, trusted_internal_data
+from try_pipelining.observation_windows import (
+    calculate_observation_windows,
+    setup_night_timerange,
+    setup_nights,
+)
+from try_pipelining.pipelines import match_science_configs, parse_tasks
+from try_pipelining.task_cache import TaskResultCache, run_cached, task_result_cache
+
+from tests.test_pipeline import alert_dict
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_and_ttl_eviction():
+    clock = FakeClock()
+    cache = TaskResultCache(max_size=2, ttl_s=10.0, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts b, the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 10.0
+    assert cache.get("c") is None
+    assert cache.stats() == {"size": 1, "hits": 2, "misses": 2, "evictions": 2}
+
+
+def observation_window_task(coords, cache=True, search_mode="uniform", **alert):
+    science_alert = ScienceAlert(**dict(alert_dict, coords=coords, **alert))
+    cfg = match_science_configs(science_alert, "configs")[0]["pipeline"]
+    tasks_cfg = dict(cfg["tasks"])
+    window_cfg = tasks_cfg["ObservationWindow"]
+    tasks_cfg["ObservationWindow"] = dict(
+        window_cfg,
+        cache=cache,
+        task_options=dict(window_cfg["task_options"], search_mode=search_mode),
+    )
+    tasks = parse_tasks(science_alert, CTANorth(), tasks_cfg)
+    return {t.task_name: t for t in tasks}
+
+
+def test_follow_up_notices_reuse_the_night_intervals(monkeypatch):
+    task_result_cache.clear()
+    coords = {"raInDeg": 262.8109, "decInDeg": 14.6481}
+    first = observation_window_task(coords)["ObservationWindow"]
+    assert first.cache_alert_fields is None
+    run_cached(first)
+    n_nights = len(task_result_cache)
+    assert n_nights >= 2
+
+    # a refined position, notified later: only the alert time cut is new
+    follow_up = observation_window_task(
+        {"raInDeg": 262.8111, "decInDeg": 14.6479},
+        alert_time=alert_dict["alert_time"] + timedelta(hours=3),
+    )["ObservationWindow"]
+    live = calculate_observation_windows(
+        follow_up.science_alert,
+        follow_up.task_options,
+        follow_up.site,
+        [
+            setup_night_timerange(night, follow_up.task_options)
+            for night in setup_nights(
+                follow_up.science_alert, follow_up.task_options, follow_up.site
+            )
+        ],
+    )
+
+    def must_not_compute(*args, **kwargs):
+        raise AssertionError("should have been taken from the cache.")
+
+    monkeypatch.setattr(window_store, "position_constraint_masks", must_not_compute)
+    result = run_cached(follow_up)
+    assert result.windows and result.windows == live
+    assert result.windows[0].start_time != run_cached(first).windows[0].start_time
+    assert len(task_result_cache) == n_nights
+
+    other = observation_window_task({"raInDeg": 263.8109, "decInDeg": 14.6481})
+    with pytest.raises(AssertionError):
+        run_cached(other["ObservationWindow"])
+
+    monkeypatch.undo()
+    task_result_cache.clear()
+    run_cached(observation_window_task(coords, cache=False)["ObservationWindow"])
+    assert len(task_result_cache) == 0
+    task_result_cache.clear()
+
+
+def test_adaptive_results_are_cached_per_trust_mode():
+    cache = TaskResultCache(coord_tolerance_deg=0.01)
+    coords = {"raInDeg": 262.8109, "decInDeg": 14.6481}
+    tasks = observation_window_task(coords, search_mode="adaptive")
+    first = run_cached(tasks["ObservationWindow"], cache)
+
+    tasks = observation_window_task(
+        {"raInDeg": 262.8111, "decInDeg": 14.6479}, search_mode="adaptive"
+    )
+    assert run_cached(tasks["ObservationWindow"], cache) is first
+    # cheap tasks are not cached
+    run_cached(tasks["CountRate"], cache)
+    assert cache.stats()["hits"] == 1 and len(cache) == 1
+
+    # unvalidated results are never served to validating pipelines
+    with trusted_internal_data():
+        trusted = run_cached(tasks["ObservationWindow"], cache)
+    assert trusted is not first and len(cache) == 2
@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from try_pipelining.data_models import (
+    CTANorth,
+    ParameterFilterOptions,
+    ParameterOptions,
+    ScienceAlert,
+)
+from try_pipelining.pipelines import parse_tasks, schedule_tasks
+from try_pipelining.task_graph import task_dependencies, topological_order
+from try_pipelining.tasks import ParameterTask
+
+from tests.test_pipeline import alert_dict
+
+
+def test_topological_order():
+    dependencies = {"c": ["a", "b"], "a": [], "b": ["a"], "d": []}
+    assert topological_order(dependencies) == ["a", "d", "b", "c"]
+
+    with pytest.raises(ValueError, match="cyclic"):
+        topological_order({"a": ["c"], "b": ["a"], "c": ["b"], "d": []})
+
+    with pytest.raises(ValueError, match="not a task"):
+        topological_order({"a": ["x"]})
+
+    tasks_cfg = {"a": {"task_type": "ParameterTask"}, "b": {"inputs": ["a"]}}
+    assert task_dependencies(tasks_cfg) == {"a": [], "b": ["a"]}
+
+
+class RecordingTask(ParameterTask):
+    def run(self):
+        self.seen_inputs = dict(self.input_results)
+        return super().run()
+
+
+@pytest.mark.parametrize("threads", [False, True])
+def test_results_are_passed_along_dependencies(threads: bool):
+    sci_alert = ScienceAlert(**alert_dict)
+    filter_options = {
+        "parameter_name": "count_rate",
+        "parameter_requirement": 1.0e3,
+        "parameter_comparison": "greater",
+    }
+    tasks_cfg = {
+        "Last": {"task_type": "ParameterTask", "inputs": ["First", "Second"]},
+        "Second": {"task_type": "ParameterTask", "inputs": ["First"]},
+        "First": {"task_type": "ParameterTask"},
+    }
+    for task_spec in tasks_cfg.values():
+        task_spec["filter_options"] = filter_options
+
+    tasks = parse_tasks(sci_alert, CTANorth(), tasks_cfg)
+    tasks = [
+        RecordingTask(
+            sci_alert,
+            t.site,
+            t.task_name,
+            t.task_type,
+            t.task_options,
+            t.filter_options,
+            t.inputs,
+        )
+        for t in tasks
+    ]
+
+    if threads:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            outcomes = list(schedule_tasks(tasks, executor))
+    else:
+        outcomes = list(schedule_tasks(tasks))
+
+    assert [t.task_name for t, _ in outcomes] == ["First", "Second", "Last"]
+    results = {t.task_name: outcome[0] for t, outcome in outcomes}
+    last = tasks[0]
+    assert last.seen_inputs.keys() == {"First", "Second"}
+    # handed over by reference, not copied
+    assert last.seen_inputs["First"] is results["First"]
+
+    with pytest.raises(ValueError, match="cyclic"):
+        tasks_cfg["First"]["inputs"] = ["Last"]
+        parse_tasks(sci_alert, CTANorth(), tasks_cfg)
+
+
+class ConcurrencyTask(ParameterTask):
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def run(self):
+        cls = ConcurrencyTask
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+        time.sleep(0.02)
+        with cls.lock:
+            cls.running -= 1
+        return super().run()
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 3])
+def test_max_in_flight_bounds_running_tasks(max_in_flight):
+    sci_alert = ScienceAlert(**alert_dict)
+    filter_options = {
+        "parameter_name": "count_rate",
+        "parameter_requirement": 1.0e3,
+        "parameter_comparison": "greater",
+    }
+    tasks = [
+        ConcurrencyTask(
+            sci_alert,
+            CTANorth(),
+            f"Task{i}",
+            "ParameterTask",
+            ParameterOptions(),
+            ParameterFilterOptions(**filter_options),
+        )
+        for i in range(6)
+    ]
+
+    ConcurrencyTask.max_running = 0
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        outcomes = list(schedule_tasks(tasks, executor, max_in_flight=max_in_flight))
+
+    assert len(outcomes) == 6
+    assert ConcurrencyTask.max_running == max_in_flight
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from try_pipelining import window_store
+from try_pipelining.data_models import CTANorth, ObservationWindowOptions
+from try_pipelining.observation_windows import (
+    calculate_observation_windows,
+    setup_night_timerange,
+    setup_nights,
+)
+from try_pipelining.window_store import (
+    WindowStore,
+    calculate_observation_windows_stored,
+)
+
+from tests.test_observation_windows import make_alert, window_options
+
+
+def test_stored_windows_match_live_windows(tmp_path, monkeypatch):
+    site = CTANorth()
+    options = ObservationWindowOptions(**window_options)
+    start = datetime(2021, 2, 10, 2, 0, 27, tzinfo=timezone.utc)
+    path = str(tmp_path / "windows.sqlite")
+
+    store = WindowStore(path)
+    for hours in (0, 30):
+        alert = make_alert(262.8109, 14.6481, start + timedelta(hours=hours))
+        nights = setup_nights(alert, options, site)
+        live = calculate_observation_windows(
+            alert,
+            options,
+            site,
+            [setup_night_timerange(night, options) for night in nights],
+        )
+        stored = calculate_observation_windows_stored(
+            alert, options, site, nights, store
+        )
+        assert live and stored == live
+    store.close()
+
+    # after a restart nothing has to be computed for known nights
+    def must_not_compute(*args, **kwargs):
+        raise AssertionError("should have been loaded from the store.")
+
+    monkeypatch.setattr(window_store, "position_constraint_masks", must_not_compute)
+    store = WindowStore(path)
+    refined = make_alert(262.8111, 14.6479, start)
+    nights = setup_nights(refined, options, site)
+    assert calculate_observation_windows_stored(refined, options, site, nights, store)
+
+    with pytest.raises(AssertionError):
+        other = make_alert(100.0, 14.6481, start)
+        calculate_observation_windows_stored(other, options, site, nights, store)
+
+
+def test_window_store_requires_uniform_search(tmp_path):
+    path = str(tmp_path / "windows.sqlite")
+    with pytest.raises(ValueError, match="adaptive"):
+        ObservationWindowOptions(
+            **window_options, search_mode="adaptive", window_store=path
+        )
+    ObservationWindowOptions(**window_options, window_store=path)
@@ -0,0 +1,98 @@
+"""
+index over the alert_matching sections of all pipeline configurations
+an Aho-Corasick automaton over all required_keys finds every key contained in
+an alert unique_id in one pass over the id. A config matches an alert type if
+all of its (distinct) required keys were found, which is the same as checking
+`all(key in unique_id for key in required_keys)` for every config.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+
+class AhoCorasick:
+    """Finds which of a set of patterns occur as substrings of a text."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Set[str]] = [set()]
+
+        for pattern in set(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].add(pattern)
+
+        # breadth first, so the fail state of a node is always done before it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def find(self, text: str) -> Set[str]:
+        found = set(self.output[0])
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            found |= self.output[state]
+        return found
+
+
+class AlertMatchingIndex:
+    """Matches alerts against the alert_matching sections of many configs.
+
+    The result is identical (including order and duplicates for configs with
+    several matching alert types) to scanning every config's required_keys.
+    """
+
+    def __init__(self, configs: List[dict]):
+        self.configs = configs
+        # one entry per (config, alert_type), in config and alert_type order
+        self.entry_configs: List[int] = []
+        self.entry_n_keys: List[int] = []
+        self.key_entries: Dict[str, List[int]] = {}
+
+        for config_id, config_data in enumerate(configs):
+            matching_reqs = config_data["alert_matching"]
+            for alert_type in matching_reqs:
+                entry = len(self.entry_configs)
+                req_keys = set(matching_reqs[alert_type]["required_keys"])
+                self.entry_configs.append(config_id)
+                self.entry_n_keys.append(len(req_keys))
+                for key in req_keys:
+                    self.key_entries.setdefault(key, []).append(entry)
+
+        self.always_matching = [
+            entry for entry, n_keys in enumerate(self.entry_n_keys) if n_keys == 0
+        ]
+        self.automaton = AhoCorasick(self.key_entries)
+
+    def match(self, unique_id: str) -> List[dict]:
+        hits: Dict[int, int] = {}
+        for key in self.automaton.find(unique_id):
+            for entry in self.key_entries[key]:
+                hits[entry] = hits.get(entry, 0) + 1
+
+        matched = [
+            entry
+            for entry, n_hits in hits.items()
+            if n_hits == self.entry_n_keys[entry]
+        ]
+        return [
+            self.configs[self.entry_configs[entry]]
+            for entry in sorted(matched + self.always_matching)
+        ]
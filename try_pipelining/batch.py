@@ -0,0 +1,181 @@
+"""
+batch runner to replay archives of alerts through all matching pipelines
+alerts are sharded in chunks over a process pool. Every worker imports astropy
+and ephem, parses the configurations and warms up the coordinate machinery once,
+then reuses them for all of its chunks. Alerts are read lazily, only a bounded
+window of chunks is in flight, so archives of any size are streamed. The per
+alert summaries are written to one JSON lines file as chunks complete (or in
+input order with --ordered).
+
+Run it with e.g.:
+    python -m try_pipelining.batch configs/ alerts.jsonl --output results.jsonl
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from try_pipelining.service import process_alert
+
+
+class BatchSummary(NamedTuple):
+    n_alerts: int
+    n_errors: int
+    elapsed_s: float
+
+    @property
+    def alerts_per_s(self) -> float:
+        return self.n_alerts / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def init_worker(path_to_configs: str):
+    """imports, parses and warms up everything a worker needs, once."""
+    import numpy as np
+
+    from try_pipelining.config_repository import get_config_repository
+    from try_pipelining.data_models import CTANorth, ObservationWindowOptions
+    from try_pipelining.observation_windows import calculate_sun_and_moon_alts
+
+    get_config_repository(path_to_configs)
+
+    options = ObservationWindowOptions(
+        max_zenith_deg=60,
+        search_range_hours=1,
+        precision_minutes=1,
+        min_delay_minutes=0,
+        max_delay_minutes=60,
+        min_duration_minutes=0,
+    )
+    calculate_sun_and_moon_alts(np.array([59215.0, 59215.01]), options, CTANorth())
+
+
+def process_chunk(alerts: List[dict], path_to_configs: str) -> List[dict]:
+    records = []
+    for alert_data in alerts:
+        try:
+            records.append(process_alert(alert_data, path_to_configs))
+        except Exception as e:
+            records.append({"unique_id": alert_data.get("unique_id"), "error": repr(e)})
+    return records
+
+
+def chunked(alerts: Iterable[dict], chunk_size: int) -> Iterator[List[dict]]:
+    alerts = iter(alerts)
+    while True:
+        chunk = list(islice(alerts, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def process_chunks(
+    executor: Executor,
+    chunks: Iterable[List[dict]],
+    path_to_configs: str,
+    max_pending: int,
+    ordered: bool = False,
+) -> Iterator[List[dict]]:
+    """Submits the chunks with at most max_pending in flight, yields their
+    records as they complete (or in input order if ordered)."""
+    chunks = iter(chunks)
+    pending = []
+    while True:
+        for chunk in islice(chunks, max_pending - len(pending)):
+            pending.append(executor.submit(process_chunk, chunk, path_to_configs))
+        if not pending:
+            return
+
+        if ordered:
+            yield pending.pop(0).result()
+            continue
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield future.result()
+
+
+def read_alerts(path: str) -> Iterator[dict]:
+    with open(path) as alert_file:
+        for line in alert_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def run_batch(
+    alerts: Iterable[dict],
+    path_to_configs: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    chunk_size: int = 16,
+    ordered: bool = False,
+) -> BatchSummary:
+    """Runs all matching pipelines for every alert on a process pool.
+
+    Args:
+        alerts (Iterable[dict]): ScienceAlert data.
+        path_to_configs (str): directory with the pipeline configurations.
+        output_path (str): JSON lines file the summaries are written to.
+        workers (int, optional): processes, defaults to the number of CPUs.
+        chunk_size (int): alerts sent to a worker at once.
+        ordered (bool): write the summaries in input order instead of as
+            they complete. Both keep two chunks per worker in flight at most.
+
+    Returns:
+        BatchSummary: counts and throughput of the batch.
+    """
+    start = time.perf_counter()
+    n_alerts = 0
+    n_errors = 0
+    workers = workers if workers is not None else os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(path_to_configs,)
+    ) as executor, open(output_path, "w") as output:
+        chunks = process_chunks(
+            executor,
+            chunked(alerts, chunk_size),
+            path_to_configs,
+            max_pending=2 * workers,
+            ordered=ordered,
+        )
+        for records in chunks:
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+                n_alerts += 1
+                n_errors += "error" in record
+
+    return BatchSummary(n_alerts, n_errors, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a file of alerts through all matching pipelines."
+    )
+    parser.add_argument("configs", help="directory with pipeline configurations")
+    parser.add_argument("alerts", help="JSON lines file with one alert per line")
+    parser.add_argument("--output", default="results.jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--ordered", action="store_true", help="keep input order")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        read_alerts(args.alerts),
+        args.configs,
+        args.output,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        ordered=args.ordered,
+    )
+    print(
+        f"processed {summary.n_alerts} alerts ({summary.n_errors} errors) "
+        f"in {summary.elapsed_s:.1f} s: {summary.alerts_per_s:.1f} alerts/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
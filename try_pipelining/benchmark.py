@@ -0,0 +1,294 @@
+"""
+offline benchmarks of the observation window and pipeline hot paths
+every benchmark is run for each of its parameters and timed repeat times. The
+results are written as JSON, two result files can be compared to flag
+regressions:
+
+    python -m try_pipelining.benchmark run --output base.json
+    python -m try_pipelining.benchmark run --output new.json
+    python -m try_pipelining.benchmark compare base.json new.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+BENCHMARK_ALERT = {
+    "unique_id": "ivo://nasa.gcn.gov/SWIFT#BAT_GRB_Pos#1234567-1337",
+    "coords": {"raInDeg": 262.8109, "decInDeg": 14.6481},
+    "alert_time": datetime(2021, 2, 10, 2, 0, 27, tzinfo=timezone.utc),
+    "measured_parameters": {"count_rate": 12300, "system_stable": True, "noise": 0.5},
+}
+# package data, so that the benchmarks also run from an installed package.
+REFERENCE_CONFIG = "benchmark_config.yaml"
+
+
+def window_options(**overrides):
+    from try_pipelining.data_models import ObservationWindowOptions
+
+    options = {
+        "max_zenith_deg": 60,
+        "search_range_hours": 48,
+        "precision_minutes": 2,
+        "min_delay_minutes": 0,
+        "max_delay_minutes": 1440,
+        "min_duration_minutes": 15,
+    }
+    options.update(overrides)
+    return ObservationWindowOptions(**options)
+
+
+def reference_config_text() -> str:
+    import pkgutil
+
+    return pkgutil.get_data("try_pipelining", REFERENCE_CONFIG).decode()
+
+
+def reference_pipeline_cfg() -> dict:
+    import yaml
+
+    return yaml.safe_load(reference_config_text())["pipeline"]
+
+
+def make_alerts(n_alerts: int):
+    from try_pipelining.data_models import ScienceAlert
+
+    return [
+        ScienceAlert(
+            **dict(
+                BENCHMARK_ALERT,
+                coords={"raInDeg": 262.8109 + 0.5 * i, "decInDeg": 14.6481},
+                alert_time=BENCHMARK_ALERT["alert_time"] + timedelta(minutes=10 * i),
+            )
+        )
+        for i in range(n_alerts)
+    ]
+
+
+# every setup function returns the callable that is timed.
+
+
+def setup_setup_nights(search_range_hours) -> Callable:
+    from try_pipelining.data_models import CTANorth
+    from try_pipelining.observation_windows import setup_nights
+
+    alert, site = make_alerts(1)[0], CTANorth()
+    options = window_options(search_range_hours=search_range_hours)
+    return lambda: setup_nights(alert, options, site)
+
+
+def setup_apply_criteria_to_night(precision_minutes) -> Callable:
+    from try_pipelining.data_models import CTANorth
+    from try_pipelining.observation_windows import (
+        apply_criteria_to_night,
+        setup_night_timerange,
+        setup_nights,
+    )
+
+    alert, site = make_alerts(1)[0], CTANorth()
+    options = window_options(precision_minutes=precision_minutes)
+    night_mjds = setup_night_timerange(setup_nights(alert, options, site)[0], options)
+    return lambda: apply_criteria_to_night(alert, options, site, night_mjds)
+
+
+def setup_calculate_moon_pars(precision_minutes) -> Callable:
+    from try_pipelining.data_models import CTANorth
+    from try_pipelining.observation_windows import (
+        calculate_moon_pars,
+        setup_night_timerange,
+        setup_nights,
+    )
+
+    alert, site = make_alerts(1)[0], CTANorth()
+    options = window_options(precision_minutes=precision_minutes)
+    night_mjds = setup_night_timerange(setup_nights(alert, options, site)[0], options)
+    return lambda: calculate_moon_pars(night_mjds, site)
+
+
+def setup_create_observation_blocks(window_hours) -> Callable:
+    from try_pipelining.data_models import ObservationWindow
+    from try_pipelining.pipelines import parse_post_actions
+
+    alert = make_alerts(1)[0]
+    post_action_cfg = reference_pipeline_cfg()["post_action"]
+    create_sb, create_obs = parse_post_actions(alert, post_action_cfg)
+    start = alert.alert_time + timedelta(hours=1)
+    window = ObservationWindow(
+        start_time=start,
+        end_time=start + timedelta(hours=window_hours),
+        delay_hours=1.0,
+        duration_hours=window_hours,
+    )
+    scheduling_block = create_sb.run(task_result=window)
+    return lambda: create_obs.run(task_result=scheduling_block)
+
+
+def setup_match_science_configs(n_configs, workdir: str) -> Callable:
+    from try_pipelining.pipelines import match_science_configs
+
+    config_dir = os.path.join(workdir, f"configs_{n_configs}")
+    os.makedirs(config_dir)
+    config_text = reference_config_text()
+    for i in range(n_configs):
+        with open(os.path.join(config_dir, f"pipeline_{i:04d}.yaml"), "w") as cfg:
+            cfg.write(config_text)
+    alert = make_alerts(1)[0]
+    return lambda: match_science_configs(alert, config_dir)
+
+
+def setup_execute_pipeline_from_cfg(n_alerts) -> Callable:
+    from try_pipelining.data_models import CTANorth
+    from try_pipelining.events import NullSink
+    from try_pipelining.pipelines import execute_pipeline_from_cfg
+    from try_pipelining.task_cache import task_result_cache
+
+    alerts, site = make_alerts(n_alerts), CTANorth()
+    pipeline_cfg = dict(reference_pipeline_cfg(), execution={"mode": "sequential"})
+
+    def run():
+        # every repetition should pay the full price
+        task_result_cache.clear()
+        for alert in alerts:
+            execute_pipeline_from_cfg(alert, site, pipeline_cfg, sink=NullSink())
+
+    return run
+
+
+# benchmark name -> (setup function, parameter name, parameter values)
+BENCHMARKS = {
+    "setup_nights": (setup_setup_nights, "search_range_hours", [24, 72, 168]),
+    "apply_criteria_to_night": (
+        setup_apply_criteria_to_night,
+        "precision_minutes",
+        [5, 2, 1],
+    ),
+    "calculate_moon_pars": (setup_calculate_moon_pars, "precision_minutes", [5, 2, 1]),
+    "create_observation_blocks": (
+        setup_create_observation_blocks,
+        "window_hours",
+        [1, 4, 8],
+    ),
+    "match_science_configs": (setup_match_science_configs, "n_configs", [1, 10, 100]),
+    "execute_pipeline_from_cfg": (
+        setup_execute_pipeline_from_cfg,
+        "n_alerts",
+        [1, 10],
+    ),
+}
+
+
+def time_call(func: Callable, repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.mean(timings),
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(repeat: int = 5, selection: Optional[str] = None) -> dict:
+    """Runs all (or the selected) benchmarks, offline.
+
+    Args:
+        repeat (int): timed calls per benchmark, after one warm up call.
+        selection (str, optional): only benchmarks whose name contains it.
+
+    Returns:
+        dict: meta data and the timings by "<benchmark>[<parameter>=<value>]".
+    """
+    from astropy.utils import iers
+
+    iers.conf.auto_download = False
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (setup, parameter, values) in BENCHMARKS.items():
+            if selection is not None and selection not in name:
+                continue
+            for value in values:
+                kwargs = {parameter: value}
+                if name == "match_science_configs":
+                    kwargs["workdir"] = workdir
+                func = setup(**kwargs)
+                func()
+                results[f"{name}[{parameter}={value}]"] = time_call(func, repeat)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare_results(base: dict, new: dict, threshold: float = 0.1) -> List[dict]:
+    """median ratios new / base of the benchmarks found in both runs."""
+    comparison = []
+    for key, base_timing in base["results"].items():
+        if key not in new["results"]:
+            continue
+        ratio = new["results"][key]["median_s"] / base_timing["median_s"]
+        comparison.append(
+            {
+                "benchmark": key,
+                "base_s": base_timing["median_s"],
+                "new_s": new["results"][key]["median_s"],
+                "ratio": ratio,
+                "regression": ratio > 1.0 + threshold,
+            }
+        )
+    return comparison
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--select", help="only benchmarks containing this")
+
+    compare_parser = commands.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_benchmarks(args.repeat, args.select)
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        for key, timing in results["results"].items():
+            print(f"{key:60s} {timing['median_s'] * 1e3:10.3f} ms")
+        return 0
+
+    with open(args.base) as base_file, open(args.new) as new_file:
+        comparison = compare_results(
+            json.load(base_file), json.load(new_file), args.threshold
+        )
+    for entry in comparison:
+        flag = "REGRESSION" if entry["regression"] else ""
+        print(
+            f"{entry['benchmark']:60s} {entry['base_s'] * 1e3:10.3f} ms "
+            f"-> {entry['new_s'] * 1e3:10.3f} ms  x{entry['ratio']:.2f} {flag}"
+        )
+    return 1 if any(entry["regression"] for entry in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+long-lived repository of the pipeline configurations of a directory
+the YAML files are parsed and validated once and kept in memory. Only files
+whose modification time (or size) and content hash changed are parsed again,
+so matching an alert against the configs is pure in-memory work, done with an
+AlertMatchingIndex over all alert_matching sections.
+
+A file that cannot be read, parsed or validated is logged and reported in
+errors; the last good version of it is kept (a new file is skipped) until it
+is fixed, so one broken file never blocks the other configurations.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+import yaml
+from yaml.loader import SafeLoader
+
+from try_pipelining.alert_index import AlertMatchingIndex
+from try_pipelining.data_models import (
+    ExecutionOptions,
+    ScienceAlert,
+    TaskConfig,
+    available_filter_options,
+    available_task_options,
+)
+from try_pipelining.post_actions import (
+    available_post_action_options,
+    available_post_actions,
+)
+from try_pipelining.task_graph import task_dependencies, topological_order
+from try_pipelining.tasks import available_tasks
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigEntry(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str
+    config_data: dict
+
+
+class ConfigError(NamedTuple):
+    mtime_ns: int
+    size: int
+    message: str
+
+
+def validate_config(config_data: dict):
+    """Checks a parsed pipeline configuration, raises ValueError if it is invalid.
+
+    All task, filter and post-action options are parsed with their pydantic
+    models, without any alert, so broken configs are found when loading them.
+    """
+    if not isinstance(config_data, dict):
+        raise ValueError("a pipeline configuration should be a mapping.")
+
+    for section in ("alert_matching", "pipeline"):
+        if section not in config_data:
+            raise ValueError(f"missing section {section}.")
+
+    for alert_type, matching_reqs in config_data["alert_matching"].items():
+        required_keys = (matching_reqs or {}).get("required_keys")
+        if not isinstance(required_keys, list):
+            raise ValueError(f"{alert_type}: required_keys should be a list.")
+
+    pipeline_cfg = config_data["pipeline"]
+    for section in ("tasks", "post_action", "final_result_from"):
+        if section not in pipeline_cfg:
+            raise ValueError(f"missing pipeline section {section}.")
+
+    for task_name, task_spec in pipeline_cfg["tasks"].items():
+        task_cfg = TaskConfig(task_name=task_name, **task_spec)
+        if task_cfg.task_type not in available_tasks:
+            raise ValueError(f"{task_name}: unknown task_type {task_cfg.task_type}.")
+        available_task_options[task_cfg.task_type](**task_cfg.task_options)
+        available_filter_options[task_cfg.task_type](**task_cfg.filter_options)
+
+    topological_order(task_dependencies(pipeline_cfg["tasks"]))
+
+    if pipeline_cfg["final_result_from"] not in pipeline_cfg["tasks"]:
+        raise ValueError(
+            f"final_result_from {pipeline_cfg['final_result_from']} is not a task."
+        )
+
+    ExecutionOptions(**pipeline_cfg.get("execution", {}))
+
+    for action_type, action_options in pipeline_cfg["post_action"].items():
+        if action_type not in available_post_actions:
+            raise ValueError(f"unknown post_action {action_type}.")
+        available_post_action_options[action_type](**action_options)
+
+
+class ConfigRepository:
+    """Parsed and validated pipeline configurations of one directory.
+
+    Args:
+        path_to_configs (str): directory with the YAML configurations.
+        refresh_interval_s (float): the directory is checked for changes at
+            most this often by refresh_if_due().
+    """
+
+    def __init__(self, path_to_configs: str, refresh_interval_s: float = 1.0):
+        self.path_to_configs = path_to_configs
+        self.refresh_interval_s = refresh_interval_s
+        self.entries: Dict[str, ConfigEntry] = {}
+        # files that failed to load, by path. Retried once they change.
+        self.errors: Dict[str, ConfigError] = {}
+        self.index = AlertMatchingIndex([])
+        self.n_parsed = 0
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _load(self, path: str, stat: os.stat_result) -> ConfigEntry:
+        with open(path, "rb") as confg_file:
+            content = confg_file.read()
+        digest = hashlib.sha256(content).hexdigest()
+
+        known = self.entries.get(path)
+        if known is not None and known.digest == digest:
+            return known._replace(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+        config_data = yaml.load(content, Loader=SafeLoader)
+        try:
+            validate_config(config_data)
+        except ValueError as e:
+            raise ValueError(f"invalid pipeline configuration {path}: {e}") from e
+
+        self.n_parsed += 1
+        return ConfigEntry(stat.st_mtime_ns, stat.st_size, digest, config_data)
+
+    def refresh(self):
+        """(Re)loads new and changed files and forgets deleted ones."""
+        with self._lock:
+            entries = {}
+            errors = {}
+            for cfg in sorted(os.listdir(self.path_to_configs)):
+                path = os.path.join(self.path_to_configs, cfg)
+                try:
+                    if not os.path.isfile(path):
+                        continue
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                known = self.entries.get(path)
+                error = self.errors.get(path)
+                if (
+                    known is not None
+                    and known.mtime_ns == stat.st_mtime_ns
+                    and known.size == stat.st_size
+                ):
+                    entries[path] = known
+                elif (
+                    error is not None
+                    and error.mtime_ns == stat.st_mtime_ns
+                    and error.size == stat.st_size
+                ):
+                    errors[path] = error
+                    if known is not None:
+                        entries[path] = known
+                else:
+                    try:
+                        entries[path] = self._load(path, stat)
+                    except Exception as e:
+                        logger.error("skipping pipeline configuration %s: %s", path, e)
+                        errors[path] = ConfigError(
+                            stat.st_mtime_ns, stat.st_size, str(e)
+                        )
+                        if known is not None:
+                            entries[path] = known
+
+            configs = [entry.config_data for entry in entries.values()]
+            if list(map(id, configs)) != list(map(id, self.configs)):
+                self.index = AlertMatchingIndex(configs)
+            self.entries = entries
+            self.errors = errors
+            self._last_refresh = time.monotonic()
+
+    def refresh_if_due(self):
+        if time.monotonic() - self._last_refresh >= self.refresh_interval_s:
+            self.refresh()
+
+    @property
+    def configs(self) -> List[dict]:
+        """all configurations, ordered by file name. Treat them as read-only."""
+        return [entry.config_data for entry in self.entries.values()]
+
+    def match(self, science_alert: ScienceAlert) -> List[dict]:
+        """configurations with an alert_matching section that fits the alert."""
+        return self.index.match(science_alert.unique_id)
+
+
+_repositories: Dict[str, ConfigRepository] = {}
+_repositories_lock = threading.Lock()
+
+
+def get_config_repository(path_to_configs: str) -> ConfigRepository:
+    """the process wide repository of a config directory, created on first use."""
+    key = os.path.abspath(path_to_configs)
+    with _repositories_lock:
+        if key not in _repositories:
+            _repositories[key] = ConfigRepository(path_to_configs)
+        repository = _repositories[key]
+
+    repository.refresh_if_due()
+    return repository
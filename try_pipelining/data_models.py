@@ -1,24 +1,86 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Any, List
+from typing import Any, List, Optional, Type, TypeVar
 
-import astropy.units as u
-from astropy.coordinates import EarthLocation
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator, validator
+
+Model = TypeVar("Model", bound=BaseModel)
+
+# set while tasks and post-actions of a pipeline with trusted internal data
+# run, per thread (and per worker process).
+_trusted_internal_data: ContextVar = ContextVar("trusted_internal_data", default=False)
+
+
+@contextmanager
+def trusted_internal_data(enabled: bool = True):
+    """models built with build_model() inside skip validation if enabled."""
+    token = _trusted_internal_data.set(enabled)
+    try:
+        yield
+    finally:
+        _trusted_internal_data.reset(token)
+
+
+def internal_data_trusted() -> bool:
+    """True inside an enabled trusted_internal_data()."""
+    return _trusted_internal_data.get()
+
+
+def build_model(model: Type[Model], **values) -> Model:
+    """Model from values computed by the pipeline itself.
+
+    Validated as usual, unless inside trusted_internal_data(): then the model
+    is constructed as is, so values need the right types and nested models
+    have to be passed as model instances. Never use it for external input
+    (alerts, configurations)."""
+    if internal_data_trusted():
+        return model.construct(**values)
+    return model(**values)
 
-from try_pipelining.observation_windows import ObservationWindow
 
 # ---------- General structs --------------------------
 
 
 class CTANorth:
-    """site definition for CTA North. Using MAGIC location right now."""
+    """site definition for CTA North. Using MAGIC location right now.
+
+    astropy is only imported once the quantities or the location are used."""
 
     def __init__(self):
-        self.lat = 28.7619 * u.deg
-        self.lon = 18.8900 * u.deg
-        self.height = 2200 * u.m
-        self.location = EarthLocation(lat=self.lat, lon=self.lon, height=self.height)
+        self.lat_deg = 28.7619
+        self.lon_deg = 18.8900
+        self.height_m = 2200.0
         self.name = "CTA North"
+        self._location = None
+
+    @property
+    def lat(self):
+        import astropy.units as u
+
+        return self.lat_deg * u.deg
+
+    @property
+    def lon(self):
+        import astropy.units as u
+
+        return self.lon_deg * u.deg
+
+    @property
+    def height(self):
+        import astropy.units as u
+
+        return self.height_m * u.m
+
+    @property
+    def location(self):
+        if self._location is None:
+            from astropy.coordinates import EarthLocation
+
+            self._location = EarthLocation(
+                lat=self.lat, lon=self.lon, height=self.height
+            )
+        return self._location
 
 
 class TaskConfig(BaseModel):
@@ -26,6 +88,39 @@ class TaskConfig(BaseModel):
     task_type: str
     task_options: dict = {}
     filter_options: dict
+    inputs: List[str] = []
+    cache: bool = True
+
+
+class ExecutionOptions(BaseModel):
+    """how the tasks of a pipeline are executed: sequential, thread or process.
+
+    With early_abort the tasks are run cheapest first and the remaining tasks
+    are skipped as soon as one of them fails.
+
+    With trusted_internal_data the models produced by tasks and post-actions
+    are constructed without validation. Alerts and configurations are always
+    validated."""
+
+    mode: str = "sequential"
+    max_workers: Optional[int] = Field(None, ge=1)
+    early_abort: bool = True
+    # results of tasks and post-actions are not validated again, see build_model
+    trusted_internal_data: bool = False
+
+    @validator("mode")
+    def validate_mode(cls, mode):
+        if mode not in ("sequential", "thread", "process"):
+            raise ValueError(f"{mode} is not a valid execution mode.")
+
+        return mode
+
+
+class ObservationWindow(BaseModel):
+    start_time: datetime
+    end_time: datetime
+    delay_hours: float
+    duration_hours: float
 
 
 class Coords(BaseModel):
@@ -89,6 +184,42 @@ class ObservationWindowOptions(BaseModel):
     min_delay_minutes: float = Field(..., ge=0)
     max_delay_minutes: float = Field(..., ge=0)
     min_duration_minutes: float = Field(..., ge=0)
+    # optional moon constraints, moon illumination in percent.
+    max_moon_phase_percent: Optional[float] = Field(None, ge=0, le=100)
+    min_moon_separation_deg: Optional[float] = Field(None, ge=0, le=180)
+    # "uniform" samples every night at precision_minutes, "adaptive" refines
+    # the edges of a coarse_step_minutes grid by bisection.
+    search_mode: str = "uniform"
+    coarse_step_minutes: float = Field(30.0, gt=0)
+    # "astropy" uses the full AltAz transformation, "fast" a numpy implementation
+    # accurate to FAST_ALTAZ_TOLERANCE_DEG, see ephemeris.py
+    ephemeris_backend: str = "astropy"
+    # path to a precomputed sun/moon archive, see ephemeris_archive.py
+    ephemeris_archive: Optional[str] = None
+    # path to a SQLite store of the night intervals, shared by the workers of
+    # a host and kept across restarts, see window_store.py. Uniform search only.
+    window_store: Optional[str] = None
+
+    @validator("search_mode")
+    def validate_search_mode(cls, search_mode):
+        if search_mode not in ("uniform", "adaptive"):
+            raise ValueError(f"{search_mode} is not a valid search_mode.")
+
+        return search_mode
+
+    @validator("ephemeris_backend")
+    def validate_ephemeris_backend(cls, ephemeris_backend):
+        if ephemeris_backend not in ("astropy", "fast"):
+            raise ValueError(f"{ephemeris_backend} is not a valid ephemeris_backend.")
+
+        return ephemeris_backend
+
+    @validator("window_store")
+    def validate_window_store(cls, window_store, values):
+        if window_store is not None and values.get("search_mode") == "adaptive":
+            raise ValueError("window_store is not supported with adaptive search_mode.")
+
+        return window_store
 
 
 @register_task_options
@@ -127,9 +258,36 @@ class ObservationWindowFilterOptions(BaseModel):
 
 @register_filter_options
 class ParameterFilterOptions(BaseModel):
-    parameter_name: str
-    parameter_requirement: Any
-    parameter_comparison: str
+    """either a single comparison of one parameter, or an expression combining
+    several conditions, see filter_expressions.py"""
+
+    parameter_name: Optional[str] = None
+    parameter_requirement: Any = None
+    parameter_comparison: Optional[str] = None
+    expression: Optional[str] = None
+
+    @validator("expression")
+    def validate_expression(cls, expression):
+        from try_pipelining.filter_expressions import compile_filter_expression
+
+        if expression is not None:
+            # compiled (and cached) right away, when the configuration is loaded.
+            compile_filter_expression(expression)
+
+        return expression
+
+    @root_validator(skip_on_failure=True)
+    def validate_comparison(cls, values):
+        if values.get("expression") is None and (
+            values.get("parameter_name") is None
+            or values.get("parameter_comparison") is None
+        ):
+            raise ValueError(
+                "either expression or parameter_name and "
+                "parameter_comparison are required."
+            )
+
+        return values
 
 
 # -------------- Output structs -----------------
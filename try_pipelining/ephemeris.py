@@ -0,0 +1,351 @@
+"""
+vectorized sun and moon ephemeris module
+low precision series (Meeus, Astronomical Algorithms, ch. 25 and 47) evaluated
+with numpy on whole time grids at once, instead of one ephem call per sample.
+
+Compared to ephem (topocentric, refracted) the moon altitude agrees to better
+than MOON_ALT_TOLERANCE_DEG, the azimuth to better than MOON_AZ_TOLERANCE_DEG
+and the illuminated percentage to better than MOON_PHASE_TOLERANCE_PERCENT.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# documented agreement with ephem.Moon() for the same observer
+MOON_ALT_TOLERANCE_DEG = 0.1
+MOON_AZ_TOLERANCE_DEG = 0.15  # away from the zenith (alt < 85 deg)
+MOON_PHASE_TOLERANCE_PERCENT = 0.1
+# documented max. altitude error of the "fast" backend w.r.t. astropy AltAz
+# (no refraction) for fixed sources and the sun.
+FAST_ALTAZ_TOLERANCE_DEG = 0.02
+
+J2000_JD = 2451545.0
+MJD_OFFSET = 2400000.5
+MJD_EPOCH = datetime(1858, 11, 17, tzinfo=timezone.utc)
+# TT - UTC, close enough for the low precision series used here.
+DELTA_T_DAYS = 69.184 / 86400.0
+EARTH_RADIUS_KM = 6378.14
+AU_KM = 149597870.7
+
+# ephem.Observer defaults, used for the refraction correction.
+DEFAULT_PRESSURE_MBAR = 1010.0
+DEFAULT_TEMPERATURE_C = 15.0
+
+# periodic terms for the moons longitude [1e-6 deg] and distance [1e-3 km]
+# columns: D, M, M', F, sum_l, sum_r
+_MOON_LR_TERMS = np.array(
+    [
+        [0, 0, 1, 0, 6288774, -20905355],
+        [2, 0, -1, 0, 1274027, -3699111],
+        [2, 0, 0, 0, 658314, -2955968],
+        [0, 0, 2, 0, 213618, -569925],
+        [0, 1, 0, 0, -185116, 48888],
+        [0, 0, 0, 2, -114332, -3149],
+        [2, 0, -2, 0, 58793, 246158],
+        [2, -1, -1, 0, 57066, -152138],
+        [2, 0, 1, 0, 53322, -170733],
+        [2, -1, 0, 0, 45758, -204586],
+        [0, 1, -1, 0, -40923, -129620],
+        [1, 0, 0, 0, -34720, 108743],
+        [0, 1, 1, 0, -30383, 104755],
+        [2, 0, 0, -2, 15327, 10321],
+        [0, 0, 1, 2, -12528, 0],
+        [0, 0, 1, -2, 10980, 79661],
+        [4, 0, -1, 0, 10675, -34782],
+        [0, 0, 3, 0, 10034, -23210],
+        [4, 0, -2, 0, 8548, -21636],
+        [2, 1, -1, 0, -7888, 24208],
+        [2, 1, 0, 0, -6766, 30824],
+        [1, 0, -1, 0, -5163, -8379],
+        [1, 1, 0, 0, 4987, -16675],
+        [2, -1, 1, 0, 4036, -12831],
+        [2, 0, 2, 0, 3994, -10445],
+        [4, 0, 0, 0, 3861, -11650],
+        [2, 0, -3, 0, 3665, 14403],
+        [0, 1, -2, 0, -2689, -7003],
+        [2, 0, -1, 2, -2602, 0],
+        [2, -1, -2, 0, 2390, 10056],
+        [1, 0, 1, 0, -2348, 6322],
+        [2, -2, 0, 0, 2236, -9884],
+    ],
+    dtype=float,
+)
+
+# periodic terms for the moons latitude [1e-6 deg]
+# columns: D, M, M', F, sum_b
+_MOON_B_TERMS = np.array(
+    [
+        [0, 0, 0, 1, 5128122],
+        [0, 0, 1, 1, 280602],
+        [0, 0, 1, -1, 277693],
+        [2, 0, 0, -1, 173237],
+        [2, 0, -1, 1, 55413],
+        [2, 0, -1, -1, 46271],
+        [2, 0, 0, 1, 32573],
+        [0, 0, 2, 1, 17198],
+        [2, 0, 1, -1, 9266],
+        [0, 0, 2, -1, 8822],
+        [2, -1, 0, -1, 8216],
+        [2, 0, -2, -1, 4324],
+        [2, 0, 1, 1, 4200],
+        [2, 1, 0, -1, -3359],
+        [2, -1, -1, 1, 2463],
+        [2, -1, 0, 1, 2211],
+        [2, -1, -1, -1, 2065],
+        [0, 1, -1, -1, -1870],
+        [4, 0, -1, -1, 1828],
+        [0, 1, 0, 1, -1794],
+        [0, 0, 0, 3, -1749],
+        [0, 1, -1, 1, -1565],
+        [1, 0, 0, 1, -1491],
+        [0, 1, 1, 1, -1475],
+        [0, 1, 1, -1, -1410],
+        [0, 1, 0, -1, -1344],
+        [1, 0, 0, -1, -1335],
+        [0, 0, 3, 1, 1107],
+        [4, 0, 0, -1, 1021],
+        [4, 0, -1, 1, 833],
+    ],
+    dtype=float,
+)
+
+
+def datetime_to_mjd(test_time: datetime) -> float:
+    """MJD (UTC) of a datetime, naive datetimes are taken to be in UTC."""
+    if test_time.tzinfo is None:
+        test_time = test_time.replace(tzinfo=timezone.utc)
+    return (test_time - MJD_EPOCH) / timedelta(days=1)
+
+
+def mjd_to_datetime(mjd: float) -> datetime:
+    """timezone aware UTC datetime of an MJD, rounded to the microsecond."""
+    return MJD_EPOCH + timedelta(microseconds=round(float(mjd) * 86400e6))
+
+
+def _centuries(jd_utc):
+    """julian centuries (TT) since J2000 for julian dates given in UTC."""
+    return (np.asarray(jd_utc, dtype=float) + DELTA_T_DAYS - J2000_JD) / 36525.0
+
+
+def _obliquity_deg(t):
+    return 23.439291 - 0.0130042 * t
+
+
+def greenwich_mean_sidereal_time_deg(jd_utc):
+    """greenwich mean sidereal time in degrees for julian dates in UTC."""
+    jd_utc = np.asarray(jd_utc, dtype=float)
+    t = (jd_utc - J2000_JD) / 36525.0
+    gmst = (
+        280.46061837
+        + 360.98564736629 * (jd_utc - J2000_JD)
+        + 0.000387933 * t**2
+        - t**3 / 38710000.0
+    )
+    return np.mod(gmst, 360.0)
+
+
+def ecliptic_to_equatorial(lon_deg, lat_deg, obliquity_deg):
+    lon = np.radians(lon_deg)
+    lat = np.radians(lat_deg)
+    eps = np.radians(obliquity_deg)
+    ra = np.arctan2(np.sin(lon) * np.cos(eps) - np.tan(lat) * np.sin(eps), np.cos(lon))
+    dec = np.arcsin(np.sin(lat) * np.cos(eps) + np.cos(lat) * np.sin(eps) * np.sin(lon))
+    return np.mod(np.degrees(ra), 360.0), np.degrees(dec)
+
+
+def sun_position(jd_utc):
+    """apparent geocentric position of the sun.
+
+    Returns:
+        tuple: ra [deg], dec [deg], ecliptic longitude [deg], distance [AU]
+    """
+    t = _centuries(jd_utc)
+    l0 = 280.46646 + 36000.76983 * t + 0.0003032 * t**2
+    m = np.radians(357.52911 + 35999.05029 * t - 0.0001537 * t**2)
+    c = (
+        (1.914602 - 0.004817 * t - 0.000014 * t**2) * np.sin(m)
+        + (0.019993 - 0.000101 * t) * np.sin(2 * m)
+        + 0.000289 * np.sin(3 * m)
+    )
+    true_lon = l0 + c
+    ecc = 0.016708634 - 0.000042037 * t
+    distance_au = 1.000001018 * (1 - ecc**2) / (1 + ecc * np.cos(m + np.radians(c)))
+
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent_lon = np.mod(true_lon - 0.00569 - 0.00478 * np.sin(omega), 360.0)
+    obliquity = _obliquity_deg(t) + 0.00256 * np.cos(omega)
+
+    ra, dec = ecliptic_to_equatorial(
+        apparent_lon, np.zeros_like(apparent_lon), obliquity
+    )
+    return ra, dec, apparent_lon, distance_au
+
+
+def moon_position(jd_utc):
+    """geocentric position of the moon (equinox of date).
+
+    Returns:
+        tuple: ra [deg], dec [deg], ecliptic longitude [deg],
+            ecliptic latitude [deg], distance [km]
+    """
+    t = _centuries(jd_utc)
+    lp = 218.3164477 + 481267.88123421 * t - 0.0015786 * t**2
+    d = 297.8501921 + 445267.1114034 * t - 0.0018819 * t**2
+    m = 357.5291092 + 35999.0502909 * t - 0.0001536 * t**2
+    mp = 134.9633964 + 477198.8675055 * t + 0.0087414 * t**2
+    f = 93.2720950 + 483202.0175233 * t - 0.0036539 * t**2
+    a1 = np.radians(119.75 + 131.849 * t)
+    a2 = np.radians(53.09 + 479264.290 * t)
+    a3 = np.radians(313.45 + 481266.484 * t)
+    ecc = 1 - 0.002516 * t - 0.0000074 * t**2
+
+    # shape (n_terms, n_times) arguments of all periodic terms in one go
+    fundamental = np.radians(np.stack(np.broadcast_arrays(d, m, mp, f)))
+    lr_args = _MOON_LR_TERMS[:, :4] @ fundamental.reshape(4, -1)
+    lr_ecc = ecc.reshape(-1) ** np.abs(_MOON_LR_TERMS[:, 1:2])
+    sum_l = np.sum(_MOON_LR_TERMS[:, 4:5] * lr_ecc * np.sin(lr_args), axis=0)
+    sum_r = np.sum(_MOON_LR_TERMS[:, 5:6] * lr_ecc * np.cos(lr_args), axis=0)
+
+    b_args = _MOON_B_TERMS[:, :4] @ fundamental.reshape(4, -1)
+    b_ecc = ecc.reshape(-1) ** np.abs(_MOON_B_TERMS[:, 1:2])
+    sum_b = np.sum(_MOON_B_TERMS[:, 4:5] * b_ecc * np.sin(b_args), axis=0)
+
+    shape = np.shape(t)
+    sum_l = sum_l.reshape(shape)
+    sum_r = sum_r.reshape(shape)
+    sum_b = sum_b.reshape(shape)
+
+    lp_rad = np.radians(lp)
+    f_rad = np.radians(f)
+    mp_rad = np.radians(mp)
+    sum_l = sum_l + 3958 * np.sin(a1) + 1962 * np.sin(lp_rad - f_rad) + 318 * np.sin(a2)
+    sum_b = (
+        sum_b
+        - 2235 * np.sin(lp_rad)
+        + 382 * np.sin(a3)
+        + 175 * np.sin(a1 - f_rad)
+        + 175 * np.sin(a1 + f_rad)
+        + 127 * np.sin(lp_rad - mp_rad)
+        - 115 * np.sin(lp_rad + mp_rad)
+    )
+
+    lon = np.mod(lp + sum_l / 1e6, 360.0)
+    lat = sum_b / 1e6
+    distance_km = 385000.56 + sum_r / 1000.0
+
+    ra, dec = ecliptic_to_equatorial(lon, lat, _obliquity_deg(t))
+    return ra, dec, lon, lat, distance_km
+
+
+def equatorial_to_horizontal(ra_deg, dec_deg, jd_utc, lat_deg, lon_deg):
+    """geometric altitude and azimuth (north through east) in degrees."""
+    lst = greenwich_mean_sidereal_time_deg(jd_utc) + lon_deg
+    ha = np.radians(lst - ra_deg)
+    dec = np.radians(dec_deg)
+    lat = np.radians(lat_deg)
+
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)
+    alt = np.arcsin(np.clip(sin_alt, -1.0, 1.0))
+    az = np.arctan2(
+        -np.cos(dec) * np.sin(ha),
+        np.sin(dec) * np.cos(lat) - np.cos(dec) * np.sin(lat) * np.cos(ha),
+    )
+    return np.degrees(alt), np.mod(np.degrees(az), 360.0)
+
+
+def _unrefraction_deg(apparent_alt_deg, pressure_mbar, temp_c):
+    """refraction for a given apparent altitude, same model as ephem (libastro)."""
+    alt = np.asarray(apparent_alt_deg, dtype=float)
+    low = (
+        ((2e-5 * alt + 1.96e-2) * alt + 1.594e-1)
+        * pressure_mbar
+        / ((273.0 + temp_c) * ((8.45e-2 * alt + 5.05e-1) * alt + 1.0))
+    )
+    low = np.where((alt < 0) & (low < 0), 0.0, low)
+    with np.errstate(divide="ignore"):
+        high = np.degrees(
+            7.888888e-5 * pressure_mbar / ((273.0 + temp_c) * np.tan(np.radians(alt)))
+        )
+    blend = np.clip(alt - 14.5, 0.0, 1.0)
+    return np.where(alt < 14.5, low, (1 - blend) * low + blend * high)
+
+
+def precess_from_j2000(ra_deg, dec_deg, jd_utc):
+    """precession of J2000 (ICRS) coordinates to the mean equinox of date."""
+    t = _centuries(jd_utc)
+    zeta = np.radians((2306.2181 * t + 0.30188 * t**2 + 0.017998 * t**3) / 3600.0)
+    z = np.radians((2306.2181 * t + 1.09468 * t**2 + 0.018203 * t**3) / 3600.0)
+    theta = np.radians((2004.3109 * t - 0.42665 * t**2 - 0.041833 * t**3) / 3600.0)
+
+    ra = np.radians(ra_deg)
+    dec = np.radians(dec_deg)
+    a = np.cos(dec) * np.sin(ra + zeta)
+    b = np.cos(theta) * np.cos(dec) * np.cos(ra + zeta) - np.sin(theta) * np.sin(dec)
+    c = np.sin(theta) * np.cos(dec) * np.cos(ra + zeta) + np.cos(theta) * np.sin(dec)
+    return np.mod(np.degrees(np.arctan2(a, b) + z), 360.0), np.degrees(np.arcsin(c))
+
+
+def source_alt_az(ra_deg, dec_deg, jd_utc, lat_deg, lon_deg):
+    """altitude and azimuth of fixed (J2000) sources, without refraction.
+
+    ra_deg, dec_deg and jd_utc are broadcast against each other, e.g. sources
+    of shape (n, 1) and times of shape (m,) give altitudes of shape (n, m).
+    """
+    ra, dec = precess_from_j2000(ra_deg, dec_deg, jd_utc)
+    return equatorial_to_horizontal(ra, dec, jd_utc, lat_deg, lon_deg)
+
+
+def sun_alt_az(jd_utc, lat_deg, lon_deg):
+    """geometric altitude and azimuth of the sun, without refraction."""
+    ra, dec, _, _ = sun_position(jd_utc)
+    return equatorial_to_horizontal(ra, dec, jd_utc, lat_deg, lon_deg)
+
+
+def refraction_deg(
+    alt_deg, pressure_mbar=DEFAULT_PRESSURE_MBAR, temp_c=DEFAULT_TEMPERATURE_C
+):
+    """atmospheric refraction to be added to a geometric altitude.
+
+    Inverts the ephem refraction model by fixed point iteration, including its
+    behaviour of refracting down to roughly -8 deg below the horizon.
+    """
+    true_alt = np.asarray(alt_deg, dtype=float)
+    apparent_alt = true_alt
+    for _ in range(8):
+        apparent_alt = true_alt + _unrefraction_deg(apparent_alt, pressure_mbar, temp_c)
+    return apparent_alt - true_alt
+
+
+def moon_alt_az_phase(jd_utc, lat_deg, lon_deg):
+    """topocentric, refracted moon altitude and azimuth and its illuminated
+    percentage for a whole time grid in one vectorized evaluation.
+
+    Args:
+        jd_utc (array): julian dates in UTC.
+        lat_deg (float): geodetic latitude of the observer.
+        lon_deg (float): east longitude of the observer.
+
+    Returns:
+        tuple: altitudes [deg], azimuths [deg], phase [percent illuminated]
+    """
+    moon_ra, moon_dec, moon_lon, moon_lat, moon_dist = moon_position(jd_utc)
+    alt, az = equatorial_to_horizontal(moon_ra, moon_dec, jd_utc, lat_deg, lon_deg)
+
+    # parallax in altitude, the moon is close enough for it to matter (~1 deg)
+    parallax = np.arcsin(EARTH_RADIUS_KM / moon_dist * np.cos(np.radians(alt)))
+    alt = alt - np.degrees(parallax)
+    alt = alt + refraction_deg(alt)
+
+    _, _, sun_lon, sun_dist_au = sun_position(jd_utc)
+    elongation = np.arccos(
+        np.cos(np.radians(moon_lat)) * np.cos(np.radians(moon_lon - sun_lon))
+    )
+    sun_dist_km = sun_dist_au * AU_KM
+    phase_angle = np.arctan2(
+        sun_dist_km * np.sin(elongation),
+        moon_dist - sun_dist_km * np.cos(elongation),
+    )
+    phase = 100.0 * (1 + np.cos(phase_angle)) / 2.0
+
+    return alt, az, phase
@@ -0,0 +1,211 @@
+"""
+precomputed sun/moon ephemeris archive
+sun and moon altitudes only depend on the site and the time, so they can be
+tabulated once per site on a fixed cadence and read back through a memory map
+by every worker process, instead of being recomputed for every alert.
+
+File layout (little endian):
+    HEADER_FORMAT header, padded to HEADER_SIZE bytes
+    float32 table of shape (len(ARCHIVE_COLUMNS), n_samples)
+
+Build an archive with:
+    python -m try_pipelining.ephemeris_archive archive.ephem --start-year 2021
+"""
+
+import argparse
+import struct
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import AltAz, get_sun
+from astropy.time import Time
+
+from try_pipelining.ephemeris import moon_alt_az_phase
+
+ARCHIVE_MAGIC = b"TPEPHEM1"
+ARCHIVE_VERSION = 1
+ARCHIVE_COLUMNS = ("sun_alt", "moon_alt", "moon_phase")
+# magic, version, n_columns, n_samples, start_mjd, step_days, lat, lon, height
+HEADER_FORMAT = "<8sIIQddddd"
+HEADER_SIZE = 128
+
+# sites must agree with the archive to this precision to use it.
+SITE_TOLERANCE_DEG = 1e-6
+SITE_TOLERANCE_M = 1e-3
+
+
+def _site_coords(site):
+    return (
+        site.lat.to_value(u.deg),
+        site.lon.to_value(u.deg),
+        site.height.to_value(u.m),
+    )
+
+
+def _compute_columns(site, mjds) -> np.ndarray:
+    times = Time(mjds, format="mjd", scale="utc")
+    altaz_frame = AltAz(obstime=times, location=site.location)
+    sun_alts = get_sun(times).transform_to(altaz_frame).alt.to_value(u.deg)
+
+    lat, lon, _ = _site_coords(site)
+    moon_alts, _, moon_phase = moon_alt_az_phase(times.jd, lat, lon)
+    return np.stack([sun_alts, moon_alts, moon_phase]).astype(np.float32)
+
+
+def build_ephemeris_archive(
+    path: str,
+    site,
+    start: datetime,
+    years: float,
+    cadence_minutes: float = 1.0,
+    chunk_days: float = 10.0,
+) -> "EphemerisArchive":
+    """Tabulates sun and moon altitudes for a site and writes them to path.
+
+    Args:
+        path (str): output file.
+        site (CTANorth): site the tables are computed for.
+        start (datetime): first sample (UTC).
+        years (float): span of the archive in years of 365.25 days.
+        cadence_minutes (float): spacing of the samples.
+        chunk_days (float): amount of samples computed per astropy call.
+
+    Returns:
+        EphemerisArchive: the freshly written archive, opened for reading.
+    """
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    start_mjd = Time(start).mjd
+    step_days = cadence_minutes / 60.0 / 24.0
+    n_samples = int(np.ceil(years * 365.25 / step_days)) + 1
+
+    lat, lon, height = _site_coords(site)
+    header = struct.pack(
+        HEADER_FORMAT,
+        ARCHIVE_MAGIC,
+        ARCHIVE_VERSION,
+        len(ARCHIVE_COLUMNS),
+        n_samples,
+        start_mjd,
+        step_days,
+        lat,
+        lon,
+        height,
+    )
+    with open(path, "wb") as archive_file:
+        archive_file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    table = np.memmap(
+        path,
+        dtype="<f4",
+        mode="r+",
+        offset=HEADER_SIZE,
+        shape=(len(ARCHIVE_COLUMNS), n_samples),
+    )
+    chunk = max(1, int(chunk_days / step_days))
+    for first in range(0, n_samples, chunk):
+        last = min(first + chunk, n_samples)
+        mjds = start_mjd + np.arange(first, last) * step_days
+        table[:, first:last] = _compute_columns(site, mjds)
+    table.flush()
+    del table
+
+    open_ephemeris_archive.cache_clear()
+    return open_ephemeris_archive(path)
+
+
+class EphemerisArchive:
+    """Read-only, memory mapped view on an ephemeris archive file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as archive_file:
+            header = archive_file.read(struct.calcsize(HEADER_FORMAT))
+        (
+            magic,
+            version,
+            n_columns,
+            n_samples,
+            self.start_mjd,
+            self.step_days,
+            self.lat,
+            self.lon,
+            self.height,
+        ) = struct.unpack(HEADER_FORMAT, header)
+
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise ValueError(f"{path} is not a version {ARCHIVE_VERSION} archive.")
+
+        self.path = path
+        self.n_samples = n_samples
+        self.end_mjd = self.start_mjd + (n_samples - 1) * self.step_days
+        self.table = np.memmap(
+            path,
+            dtype="<f4",
+            mode="r",
+            offset=HEADER_SIZE,
+            shape=(n_columns, n_samples),
+        )
+
+    def matches_site(self, site) -> bool:
+        lat, lon, height = _site_coords(site)
+        return (
+            abs(self.lat - lat) < SITE_TOLERANCE_DEG
+            and abs(self.lon - lon) < SITE_TOLERANCE_DEG
+            and abs(self.height - height) < SITE_TOLERANCE_M
+        )
+
+    def covers(self, mjds) -> bool:
+        return bool(np.min(mjds) >= self.start_mjd and np.max(mjds) <= self.end_mjd)
+
+    def interpolate(self, column: str, mjds) -> np.ndarray:
+        """linear interpolation of a column, only touching the pages needed."""
+        if not self.covers(mjds):
+            raise ValueError(
+                f"requested times are outside of the archive {self.path} range."
+            )
+
+        values = self.table[ARCHIVE_COLUMNS.index(column)]
+        position = (np.asarray(mjds, dtype=float) - self.start_mjd) / self.step_days
+        lower = np.clip(np.floor(position).astype(np.int64), 0, self.n_samples - 2)
+        weight = position - lower
+        return (1.0 - weight) * values[lower] + weight * values[lower + 1]
+
+
+@lru_cache(maxsize=None)
+def open_ephemeris_archive(path: str) -> EphemerisArchive:
+    """Opens an archive once per process, the pages are shared via the OS."""
+    return EphemerisArchive(path)
+
+
+def main(argv=None):
+    from try_pipelining.data_models import CTANorth
+
+    sites = {"CTANorth": CTANorth}
+
+    parser = argparse.ArgumentParser(
+        description="Precompute a sun/moon ephemeris archive for a site."
+    )
+    parser.add_argument("path", help="output archive file")
+    parser.add_argument("--site", choices=sites.keys(), default="CTANorth")
+    parser.add_argument("--start-year", type=int, required=True)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--cadence-minutes", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    archive = build_ephemeris_archive(
+        args.path,
+        sites[args.site](),
+        start=datetime(args.start_year, 1, 1, tzinfo=timezone.utc),
+        years=args.years,
+        cadence_minutes=args.cadence_minutes,
+    )
+    print(
+        f"wrote {archive.n_samples} samples "
+        f"(MJD {archive.start_mjd:.1f} - {archive.end_mjd:.1f}) to {args.path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
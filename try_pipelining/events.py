@@ -0,0 +1,161 @@
+"""
+structured pipeline events and the sinks consuming them
+the pipeline emits events (tasks started / finished, post-actions done,
+results, ...) to a sink, any callable taking a PipelineEvent. Rendering with
+rich is just one sink (ConsoleSink); headless runs use a NullSink, a ListSink
+or a JsonlSink instead and never touch the terminal.
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, TextIO
+
+
+class PipelineEvent(NamedTuple):
+    kind: str
+    name: str = ""
+    data: Dict[str, Any] = {}
+    time: float = 0.0
+
+
+EventSink = Callable[[PipelineEvent], None]
+
+
+def make_event(kind: str, name: str = "", **data) -> PipelineEvent:
+    return PipelineEvent(kind, name, data, time.time())
+
+
+def json_default(obj):
+    """json.dumps default: columnar batches as records, else like pydantic."""
+    from pydantic.json import pydantic_encoder
+
+    if hasattr(obj, "to_records"):
+        return obj.to_records()
+    return pydantic_encoder(obj)
+
+
+class NullSink:
+    """discards all events."""
+
+    def __call__(self, event: PipelineEvent):
+        pass
+
+
+class ListSink:
+    """keeps all events in memory, e.g. for tests or a later summary."""
+
+    def __init__(self):
+        self.events: List[PipelineEvent] = []
+
+    def __call__(self, event: PipelineEvent):
+        self.events.append(event)
+
+    def of_kind(self, kind: str) -> List[PipelineEvent]:
+        return [event for event in self.events if event.kind == kind]
+
+
+class JsonlSink:
+    """writes every event as one JSON line to a text stream."""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def __call__(self, event: PipelineEvent):
+        self.stream.write(json.dumps(event._asdict(), default=json_default))
+        self.stream.write("\n")
+
+
+class MultiSink:
+    """passes every event on to several sinks."""
+
+    def __init__(self, *sinks: EventSink):
+        self.sinks = sinks
+
+    def __call__(self, event: PipelineEvent):
+        for sink in self.sinks:
+            sink(event)
+
+
+class ConsoleSink:
+    """renders the events with rich: progress bars, reports and results."""
+
+    status_report = {
+        "PASS": "[bold green]PASS",
+        "FAIL": "[bold red]FAIL",
+        "SKIP": "[bold yellow]SKIP",
+    }
+
+    def __init__(self):
+        self._progress = None
+        self._post_action_tree = None
+
+    def _start_progress(self, description: str, total: int):
+        from rich.progress import Progress
+
+        self._progress = Progress()
+        self._progress.start()
+        self._progress.add_task(description, total=total)
+
+    def _stop_progress(self):
+        if self._progress is not None:
+            self._progress.stop()
+            self._progress = None
+
+    def __call__(self, event: PipelineEvent):
+        from rich import print
+        from rich.tree import Tree
+
+        if event.kind == "tasks_started":
+            self._start_progress("[bold blue]+Running Tasks...", event.data["n_tasks"])
+
+        elif event.kind == "task_finished" and self._progress is not None:
+            self._progress.advance(self._progress.task_ids[0])
+
+        elif event.kind == "tasks_report":
+            self._stop_progress()
+            task_tree = Tree("[bold Blue]+Tasks report:", highlight=True)
+            for task_name, status in event.data["status"].items():
+                task_tree.add(f"{task_name} - {self.status_report[status]}")
+            print(task_tree)
+
+        elif event.kind == "pipeline_rejected":
+            print(
+                "[bold red]Some Tasks failed... "
+                "-> No valid result returned from Pipeline."
+            )
+            print(
+                "[bold red]Nothing more do be done here ... ",
+                ":frowning_face_with_open_mouth:",
+            )
+
+        elif event.kind == "post_actions_started":
+            self._post_action_tree = Tree(
+                "[bold Blue]+Post-action report:", highlight=True
+            )
+            self._start_progress(
+                "[bold blue]+Executing Post-action", event.data["n_post_actions"]
+            )
+
+        elif event.kind == "post_action_done":
+            self._progress.advance(self._progress.task_ids[0])
+            self._post_action_tree.add(event.name + "[bold green] DONE")
+
+        elif event.kind == "post_actions_report":
+            self._stop_progress()
+            print(self._post_action_tree)
+
+        elif event.kind == "results":
+            results = event.data["results"]
+            sb = results["CreateWobbleSchedulingBlock"]
+            obs = results["CreateObservationBlocks"]
+            print("[bold blue]--- RESULTS ---")
+            print(f"[blue] got {type(sb).__name__}:")
+            print(sb.dict())
+            print(f"[blue] got {len(obs)} {type(obs[0]).__name__}s:")
+            for i, r in enumerate(obs):
+                print(f"[bold blue] {type(r).__name__} {i}:")
+                print(r.dict())
+            print("[bold blue]--------------")
+
+        elif event.kind == "no_results":
+            print("No valid results")
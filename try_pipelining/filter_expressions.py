@@ -0,0 +1,192 @@
+"""
+filter expressions on the measured parameters of an alert
+an expression is a Python-like boolean condition, e.g.
+
+    system_stable and 1e3 < count_rate <= 1e6 and (missing(noise) or noise < 10.5)
+    instrument in ["BAT", "XRT"] and not flag == "retracted"
+
+Names are looked up in the parameters. Supported are and, or, not, (chained)
+comparisons, in / not in with literal lists, and missing(name) / present(name).
+A comparison (or bare name) using a missing parameter is unknown, neither true
+nor false: not keeps it unknown, and / or only decide without it if another
+operand is false / true, independent of the order of the operands. An expression
+that stays unknown does not pass. Values that cannot be compared raise a
+FilterExpressionError.
+Expressions are parsed and compiled once into a plain function,
+compile_filter_expression caches them per process by their text.
+"""
+
+import ast
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+Parameters = Dict[str, Any]
+Evaluator = Callable[[Parameters], Any]
+
+# value of a parameter that is not in the parameters.
+MISSING = object()
+# outcome of a condition on a missing parameter.
+UNKNOWN = None
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda value, container: value in container,
+    ast.NotIn: lambda value, container: value not in container,
+}
+
+
+class FilterExpressionError(ValueError):
+    """the expression is not valid, uses unsupported syntax or cannot be
+    evaluated for the parameters."""
+
+
+def _literal(node: ast.AST):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        raise FilterExpressionError(
+            f"unsupported expression: {ast.dump(node)}"
+        ) from None
+
+
+def _compile_value(node: ast.AST) -> Evaluator:
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda parameters: parameters.get(name, MISSING)
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        values = _literal(node)
+        try:
+            values = frozenset(values)
+        except TypeError:
+            values = tuple(values)
+        return lambda parameters: values
+
+    value = _literal(node)
+    return lambda parameters: value
+
+
+def _compile_compare(node: ast.Compare) -> Evaluator:
+    operands = [_compile_value(node.left)] + [
+        _compile_value(comparator) for comparator in node.comparators
+    ]
+    try:
+        comparisons = [COMPARISONS[type(op)] for op in node.ops]
+    except KeyError:
+        raise FilterExpressionError("only ==, !=, <, <=, >, >=, in and not in.")
+
+    if len(comparisons) == 1:
+        left, right = operands
+        compare = comparisons[0]
+
+        def evaluate(parameters):
+            a, b = left(parameters), right(parameters)
+            if a is MISSING or b is MISSING:
+                return UNKNOWN
+            return bool(compare(a, b))
+
+        return evaluate
+
+    def evaluate_chain(parameters):
+        values = [operand(parameters) for operand in operands]
+        if any(value is MISSING for value in values):
+            return UNKNOWN
+        return all(
+            compare(a, b) for compare, a, b in zip(comparisons, values, values[1:])
+        )
+
+    return evaluate_chain
+
+
+def _compile_call(node: ast.Call) -> Evaluator:
+    if (
+        not isinstance(node.func, ast.Name)
+        or node.func.id not in ("missing", "present")
+        or len(node.args) != 1
+        or not isinstance(node.args[0], ast.Name)
+        or node.keywords
+    ):
+        raise FilterExpressionError("only missing(name) and present(name) calls.")
+
+    name = node.args[0].id
+    if node.func.id == "missing":
+        return lambda parameters: name not in parameters
+    return lambda parameters: name in parameters
+
+
+def _compile_bool_op(node: ast.BoolOp) -> Evaluator:
+    conditions = [_compile_condition(value) for value in node.values]
+    # and is decided by a false operand, or by a true one.
+    decisive = not isinstance(node.op, ast.And)
+
+    def evaluate(parameters):
+        outcome = not decisive
+        for condition in conditions:
+            value = condition(parameters)
+            if value is decisive:
+                return decisive
+            if value is UNKNOWN:
+                outcome = UNKNOWN
+        return outcome
+
+    return evaluate
+
+
+def _compile_condition(node: ast.AST) -> Evaluator:
+    """evaluators of conditions return True, False or UNKNOWN."""
+    if isinstance(node, ast.BoolOp):
+        return _compile_bool_op(node)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        condition = _compile_condition(node.operand)
+
+        def evaluate(parameters):
+            value = condition(parameters)
+            return UNKNOWN if value is UNKNOWN else not value
+
+        return evaluate
+
+    if isinstance(node, ast.Compare):
+        return _compile_compare(node)
+
+    if isinstance(node, ast.Call):
+        return _compile_call(node)
+
+    value = _compile_value(node)
+
+    def evaluate_truth(parameters):
+        result = value(parameters)
+        return UNKNOWN if result is MISSING else bool(result)
+
+    return evaluate_truth
+
+
+@lru_cache(maxsize=None)
+def compile_filter_expression(expression: str) -> Callable[[Parameters], bool]:
+    """Compiles a filter expression into a function of the parameters.
+
+    Raises:
+        FilterExpressionError: for invalid or unsupported expressions.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise FilterExpressionError(f"invalid filter expression: {e.msg}") from None
+
+    condition = _compile_condition(tree.body)
+
+    def evaluate(parameters: Parameters) -> bool:
+        try:
+            return condition(parameters) is True
+        except TypeError as e:
+            raise FilterExpressionError(
+                f"cannot evaluate filter expression {expression!r}: {e}"
+            ) from None
+
+    return evaluate
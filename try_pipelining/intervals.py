@@ -0,0 +1,105 @@
+"""
+interval algebra for observation constraints
+every constraint (sun, moon, source, ...) is represented as a sorted set of
+closed time intervals. Combining constraints costs on the order of the number
+of transitions, not the number of samples of the time grid.
+"""
+
+from typing import Iterator, Tuple
+
+import numpy as np
+
+
+class IntervalSet:
+    """Sorted, disjoint set of closed intervals [start, end] (e.g. in MJD).
+
+    Use IntervalSet.from_unsorted() for intervals that might overlap.
+    """
+
+    def __init__(self, starts=(), ends=()):
+        self.starts = np.asarray(starts, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        if self.starts.shape != self.ends.shape:
+            raise ValueError("starts and ends should be of same length.")
+
+    @classmethod
+    def from_unsorted(cls, starts, ends) -> "IntervalSet":
+        """sorts and merges overlapping or touching intervals."""
+        return _combine([cls(starts, ends)], min_count=1)
+
+    @classmethod
+    def from_mask(cls, times, mask, segments=None) -> "IntervalSet":
+        """one interval per run of True samples, from its first to its last time.
+
+        Args:
+            times (np.ndarray): sorted sample times.
+            mask (np.ndarray): bool per sample.
+            segments (np.ndarray, optional): id per sample, runs never extend
+                over a change of the id (e.g. from one night into the next).
+        """
+        mask = np.asarray(mask, dtype=bool)
+        times = np.asarray(times, dtype=float)
+        if not len(mask):
+            return cls()
+
+        previous = np.concatenate([[False], mask[:-1]])
+        following = np.concatenate([mask[1:], [False]])
+        if segments is not None:
+            same_segment = np.asarray(segments[1:]) == np.asarray(segments[:-1])
+            previous[1:] &= same_segment
+            following[:-1] &= same_segment
+
+        return cls(times[mask & ~previous], times[mask & ~following])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        return zip(self.starts.tolist(), self.ends.tolist())
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, IntervalSet)
+            and np.array_equal(self.starts, other.starts)
+            and np.array_equal(self.ends, other.ends)
+        )
+
+    def __repr__(self):
+        return f"IntervalSet({list(self)})"
+
+    @property
+    def durations(self) -> np.ndarray:
+        return self.ends - self.starts
+
+    def intersection(self, *others: "IntervalSet") -> "IntervalSet":
+        sets = [self, *others]
+        return _combine(sets, min_count=len(sets))
+
+    def union(self, *others: "IntervalSet") -> "IntervalSet":
+        return _combine([self, *others], min_count=1)
+
+    def filter_min_duration(self, min_duration: float) -> "IntervalSet":
+        keep = self.durations >= min_duration
+        return IntervalSet(self.starts[keep], self.ends[keep])
+
+
+def _combine(sets, min_count: int) -> IntervalSet:
+    """sweep over all boundaries, keeping the times covered by >= min_count sets."""
+    starts = np.concatenate([s.starts for s in sets])
+    ends = np.concatenate([s.ends for s in sets])
+    if not len(starts):
+        return IntervalSet()
+
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts)), -np.ones(len(ends))])
+    # starts before ends at equal times, the intervals are closed
+    order = np.lexsort((-deltas, times))
+    times = times[order]
+    inside = np.cumsum(deltas[order]) >= min_count
+    was_inside = np.concatenate([[False], inside[:-1]])
+
+    return IntervalSet(times[inside & ~was_inside], times[~inside & was_inside])
+
+
+def intersection(*sets: IntervalSet) -> IntervalSet:
+    return _combine(sets, min_count=len(sets))
@@ -0,0 +1,159 @@
+"""
+process wide metrics: wall and CPU time per stage and counters
+tasks, post-actions and the stages of the observation window calculation are
+timed into the registry, which can be dumped as Prometheus text or JSON. The
+registry is disabled by default, then every instrumented call only costs one
+attribute lookup. Every process has its own registry: tasks of a pipeline run on a
+process pool send their counters back with their result, pipelines run entirely
+in another process (e.g. by batch.py) count into the registry of that process.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Tuple
+
+PREFIX = "try_pipelining_"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """as the Prometheus text format requires: backslash, quote and newline."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Counters, keyed by metric name and labels.
+
+    A timer adds three counters: <name>_calls_total, <name>_wall_seconds_total
+    and <name>_cpu_seconds_total (CPU time of the calling thread).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            yield
+            return
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_timing(
+                name,
+                time.perf_counter() - wall_start,
+                time.thread_time() - cpu_start,
+                **labels,
+            )
+
+    def add_timing(self, name: str, wall_seconds: float, cpu_seconds: float, **labels):
+        """the counters of a timer, for a call timed elsewhere."""
+        self.inc(f"{name}_calls_total", **labels)
+        self.inc(f"{name}_wall_seconds_total", wall_seconds, **labels)
+        self.inc(f"{name}_cpu_seconds_total", cpu_seconds, **labels)
+
+    @contextmanager
+    def collecting(self):
+        """Counts into fresh counters, which are yielded, instead of the registry.
+
+        Meant for worker processes, which run one task at a time and hand the
+        counters back to the registry of the parent, see merge()."""
+        with self._lock:
+            enabled, counters = self.enabled, self.counters
+            collected: Dict[str, Dict[LabelKey, float]] = {}
+            self.enabled, self.counters = True, collected
+        try:
+            yield collected
+        finally:
+            with self._lock:
+                self.enabled, self.counters = enabled, counters
+
+    def merge(self, counters: Dict[str, Dict[LabelKey, float]]):
+        """adds counters collected elsewhere, e.g. in a worker process."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, series in counters.items():
+                own_series = self.counters.setdefault(name, {})
+                for key, value in series.items():
+                    own_series[key] = own_series.get(key, 0.0) + value
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+
+    def value(self, name: str, **labels) -> float:
+        return self.counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return json.dumps(
+                {
+                    name: [
+                        {"labels": dict(key), "value": value}
+                        for key, value in series.items()
+                    ]
+                    for name, series in sorted(self.counters.items())
+                },
+                indent=2,
+            )
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for key, value in series.items():
+                    labels = ",".join(
+                        f'{label}="{_escape_label_value(label_value)}"'
+                        for label, label_value in key
+                    )
+                    labels = f"{{{labels}}}" if labels else ""
+                    lines.append(f"{PREFIX}{name}{labels} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+# the registry of this process.
+registry = MetricsRegistry()
+
+
+def enable_metrics(enabled: bool = True) -> MetricsRegistry:
+    registry.enabled = enabled
+    return registry
+
+
+def timed_stage(stage: str):
+    """decorator, times a function as an observation window stage."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            with registry.timer("observation_window_stage", stage=stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
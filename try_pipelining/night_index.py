@@ -0,0 +1,139 @@
+"""
+sorted index of night boundaries (sun set / sun rise) per site
+filled lazily with ephem in blocks of nights and cached for the lifetime of the
+process, so that the nights of a search range can be answered with a binary
+search instead of one ephem.Observer per night and alert. Earlier nights are
+added in front, so alerts out of chronological order keep the index.
+"""
+
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import ephem
+from astropy import units as u
+
+# the first night is searched from this long before the requested time
+SEED_MARGIN = timedelta(days=1)
+
+
+def _to_utc_datetime(ephem_date) -> datetime:
+    return ephem_date.datetime().replace(tzinfo=timezone.utc)
+
+
+def _as_utc(test_time: datetime) -> datetime:
+    """naive datetimes are taken to be in UTC already."""
+    if test_time.tzinfo is None:
+        return test_time.replace(tzinfo=timezone.utc)
+    return test_time.astimezone(timezone.utc)
+
+
+def _to_ephem_date(test_time: datetime):
+    return ephem.Date(_as_utc(test_time).replace(tzinfo=None))
+
+
+class NightIndex:
+    """Sorted, gap-free list of consecutive (sun set, sun rise) pairs of a site.
+
+    The lists are only read and changed while holding the lock."""
+
+    def __init__(self, lat_deg: float, lon_deg: float, height_m: float, block=32):
+        self.lat_deg = lat_deg
+        self.lon_deg = lon_deg
+        self.height_m = height_m
+        self.block = block
+        self.sun_sets: List[datetime] = []
+        self.sun_rises: List[datetime] = []
+        self._lock = threading.Lock()
+
+    def _observer(self):
+        obs = ephem.Observer()
+        obs.lon = str(self.lon_deg)
+        obs.lat = str(self.lat_deg)
+        obs.elev = self.height_m
+        return obs
+
+    def _seed(self, start: datetime):
+        obs = self._observer()
+        obs.date = _to_ephem_date(start - SEED_MARGIN)
+        sun_set = obs.next_setting(ephem.Sun(), use_center=True)
+        sun_rise = obs.next_rising(ephem.Sun(), start=sun_set, use_center=True)
+        self.sun_sets = [_to_utc_datetime(sun_set)]
+        self.sun_rises = [_to_utc_datetime(sun_rise)]
+
+    def _prepend(self, start: datetime):
+        obs = self._observer()
+        sun = ephem.Sun()
+        while self.sun_rises[0] > start:
+            first_set = _to_ephem_date(self.sun_sets[0])
+            sun_sets, sun_rises = [], []
+            for _ in range(self.block):
+                first_set = obs.previous_setting(sun, start=first_set, use_center=True)
+                sun_rise = obs.next_rising(sun, start=first_set, use_center=True)
+                sun_sets.append(_to_utc_datetime(first_set))
+                sun_rises.append(_to_utc_datetime(sun_rise))
+            self.sun_sets = sun_sets[::-1] + self.sun_sets
+            self.sun_rises = sun_rises[::-1] + self.sun_rises
+
+    def _extend(self, end: datetime):
+        obs = self._observer()
+        sun = ephem.Sun()
+        while self.sun_sets[-1] <= end:
+            last_rise = _to_ephem_date(self.sun_rises[-1])
+            for _ in range(self.block):
+                sun_set = obs.next_setting(sun, start=last_rise, use_center=True)
+                last_rise = obs.next_rising(sun, start=sun_set, use_center=True)
+                self.sun_sets.append(_to_utc_datetime(sun_set))
+                self.sun_rises.append(_to_utc_datetime(last_rise))
+
+    def _precompute(self, start: datetime, end: datetime):
+        if not self.sun_rises:
+            self._seed(start)
+        self._prepend(start)
+        self._extend(end)
+
+    def precompute(self, start: datetime, end: datetime):
+        """makes sure all nights between start and end are in the index."""
+        start, end = _as_utc(start), _as_utc(end)
+        with self._lock:
+            self._precompute(start, end)
+
+    def nights_between(
+        self, start: datetime, end: datetime
+    ) -> List[Tuple[datetime, datetime]]:
+        """all nights that end after start and begin no later than end.
+
+        A night that is ongoing at start is included with its original sun set.
+        """
+        start, end = _as_utc(start), _as_utc(end)
+        with self._lock:
+            self._precompute(start, end)
+            first = bisect_right(self.sun_rises, start)
+            last = bisect_right(self.sun_sets, end)
+            return list(zip(self.sun_sets[first:last], self.sun_rises[first:last]))
+
+    def night_of(self, test_time: datetime) -> Tuple[datetime, datetime]:
+        """the night ongoing at test_time or the next one."""
+        test_time = _as_utc(test_time)
+        with self._lock:
+            self._precompute(test_time, test_time + SEED_MARGIN)
+            idx = bisect_right(self.sun_rises, test_time)
+            return self.sun_sets[idx], self.sun_rises[idx]
+
+
+_night_indices: Dict[Tuple[float, float, float], NightIndex] = {}
+_night_indices_lock = threading.Lock()
+
+
+def night_index_for_site(site) -> NightIndex:
+    """the process wide NightIndex of a site."""
+    key = (
+        site.lat.to_value(u.deg),
+        site.lon.to_value(u.deg),
+        site.height.to_value(u.m),
+    )
+    with _night_indices_lock:
+        if key not in _night_indices:
+            _night_indices[key] = NightIndex(*key)
+        return _night_indices[key]
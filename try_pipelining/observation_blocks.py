@@ -0,0 +1,126 @@
+"""
+columnar representation of many observation blocks
+start / end times and target coordinates are kept as NumPy columns and checked
+once, in bulk. ObservationBlock models are only created for the blocks that are
+actually accessed, so long monitoring windows and batch reprocessing do not pay
+for thousands of validated model instances.
+"""
+
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+
+from try_pipelining.data_models import ObservationBlock, build_model
+
+
+def to_utc_datetime64(times: List[datetime]) -> np.ndarray:
+    """naive datetimes are taken to be in UTC already."""
+    return np.array(
+        [
+            t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t
+            for t in times
+        ],
+        dtype="datetime64[us]",
+    )
+
+
+class ObservationBlockBatch(Sequence):
+    """Array backed, read-only sequence of ObservationBlocks.
+
+    Args:
+        start_times (np.ndarray): datetime64[us] (UTC) start of every block.
+        end_times (np.ndarray): datetime64[us] (UTC) end of every block.
+        ra_target_deg (np.ndarray): target RA of every block.
+        dec_target_deg (np.ndarray): target Dec of every block.
+        tzinfo (tzinfo, optional): time zone of the materialized datetimes,
+            None for naive datetimes.
+    """
+
+    def __init__(
+        self,
+        start_times,
+        end_times,
+        ra_target_deg,
+        dec_target_deg,
+        tzinfo: Optional[timezone] = timezone.utc,
+    ):
+        self.start_times = np.asarray(start_times, dtype="datetime64[us]")
+        self.end_times = np.asarray(end_times, dtype="datetime64[us]")
+        self.ra_target_deg = np.asarray(ra_target_deg, dtype=float)
+        self.dec_target_deg = np.asarray(dec_target_deg, dtype=float)
+        self.tzinfo = tzinfo
+
+        columns = (self.start_times, self.end_times, self.ra_target_deg)
+        if any(column.shape != self.dec_target_deg.shape for column in columns):
+            raise ValueError("all columns should be of same length.")
+        for name in ("ra_target_deg", "dec_target_deg"):
+            values = getattr(self, name)
+            if np.any((values < 0) | (values > 360)):
+                raise ValueError(f"{name} should be within [0, 360].")
+
+    @classmethod
+    def from_blocks(cls, blocks: List[ObservationBlock]) -> "ObservationBlockBatch":
+        tzinfo = blocks[0].start_time.tzinfo if blocks else timezone.utc
+        return cls(
+            to_utc_datetime64([ob.start_time for ob in blocks]),
+            to_utc_datetime64([ob.end_time for ob in blocks]),
+            [ob.ra_target_deg for ob in blocks],
+            [ob.dec_target_deg for ob in blocks],
+            tzinfo,
+        )
+
+    def __len__(self):
+        return len(self.ra_target_deg)
+
+    def _datetime(self, value: np.datetime64) -> datetime:
+        naive = value.astype(datetime)
+        if self.tzinfo is None:
+            return naive
+        return naive.replace(tzinfo=timezone.utc).astimezone(self.tzinfo)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ObservationBlockBatch(
+                self.start_times[index],
+                self.end_times[index],
+                self.ra_target_deg[index],
+                self.dec_target_deg[index],
+                self.tzinfo,
+            )
+
+        return build_model(
+            ObservationBlock,
+            start_time=self._datetime(self.start_times[index]),
+            end_time=self._datetime(self.end_times[index]),
+            ra_target_deg=float(self.ra_target_deg[index]),
+            dec_target_deg=float(self.dec_target_deg[index]),
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or len(self) != len(other):
+            return False
+        return all(ob == other_ob for ob, other_ob in zip(self, other))
+
+    def __repr__(self):
+        return f"ObservationBlockBatch(n_blocks={len(self)})"
+
+    def to_records(self) -> List[dict]:
+        """all blocks as dicts (like ObservationBlock.dict()), without models."""
+        start_times = [self._datetime(t) for t in self.start_times]
+        end_times = [self._datetime(t) for t in self.end_times]
+        return [
+            {
+                "start_time": start_time,
+                "end_time": end_time,
+                "ra_target_deg": ra,
+                "dec_target_deg": dec,
+            }
+            for start_time, end_time, ra, dec in zip(
+                start_times,
+                end_times,
+                self.ra_target_deg.tolist(),
+                self.dec_target_deg.tolist(),
+            )
+        ]
@@ -3,23 +3,28 @@ observation window calculation module
 currently mostly being used by the CalculateObservability Task in tasks.py
 """
 
-from datetime import date, datetime, timezone
+from datetime import date, datetime, timedelta
 from typing import List
 
-import ephem
 import numpy as np
 from astropy import units as u
-from astropy.coordinates import AltAz, Angle, SkyCoord, get_sun
+from astropy.coordinates import AltAz, SkyCoord, get_sun
 from astropy.time import Time
-from matplotlib.dates import date2num, num2date
 from pydantic import BaseModel
 
-
-class ObservationWindow(BaseModel):
-    start_time: datetime
-    end_time: datetime
-    delay_hours: float
-    duration_hours: float
+from try_pipelining.data_models import ObservationWindow, build_model
+from try_pipelining.ephemeris import (
+    MJD_OFFSET,
+    datetime_to_mjd,
+    mjd_to_datetime,
+    moon_alt_az_phase,
+    source_alt_az,
+    sun_alt_az,
+)
+from try_pipelining.ephemeris_archive import open_ephemeris_archive
+from try_pipelining.intervals import IntervalSet, intersection
+from try_pipelining.metrics import registry as metrics_registry, timed_stage
+from try_pipelining.night_index import night_index_for_site
 
 
 class Night(BaseModel):
@@ -28,171 +33,518 @@ class Night(BaseModel):
     sun_rise: datetime
 
 
+@timed_stage("setup_nights")
 def setup_nights(alert, options, site) -> List[Night]:
     """Identifies the nights that should be probed for valid observation windows.
 
+    All nights of the search range are looked up at once in the (cached)
+    night boundary index of the site.
+
     Args:
-        alert_received_time (datetime): [description]
-        search_range (Quantity): [description]
-        site (EarthLocation): [description]
+        alert (ScienceAlert): alert, the search starts at its alert_time.
+        options (ObservationWindowOptions): options with the search_range_hours.
+        site (CTANorth): site of the observatory.
 
     Returns:
         List[Night]: list of nights.
     """
-    nights = []
-    # identify how many nights to consider for observations window search
-    min_time = Time(alert.alert_time, scale="utc")
-    max_time = min_time + options.search_range_hours * u.hour
-
-    end = min_time
-    while end < max_time:
-        if end > max_time:
-            break
-
-        sunset, sunrise = find_next_sun_rise_and_set(site, end.datetime)
+    min_time = alert.alert_time
+    max_time = min_time + timedelta(hours=options.search_range_hours)
 
-        if sunset > max_time:
-            break
-
-        evening_date = date(sunset.year, sunset.month, sunset.day)
-        nights.append(
-            Night(evening_date=evening_date, sun_set=sunset, sun_rise=sunrise)
+    nights = [
+        make_night(sunset, sunrise)
+        for sunset, sunrise in night_index_for_site(site).nights_between(
+            min_time, max_time
         )
-        end = Time(sunrise)
-
+    ]
+    metrics_registry.inc("nights_evaluated_total", len(nights))
     return nights
 
 
-def setup_night_timerange(night, options):
+def make_night(sunset, sunrise) -> Night:
+    evening_date = date(sunset.year, sunset.month, sunset.day)
+    return Night(evening_date=evening_date, sun_set=sunset, sun_rise=sunrise)
+
+
+@timed_stage("setup_night_timerange")
+def setup_night_timerange(night, options) -> np.ndarray:
+    """uniform grid of MJDs (UTC) from sun set to sun rise."""
     night_duration = night.sun_rise - night.sun_set
     n_steps = abs(
         int(night_duration.total_seconds() / (options.precision_minutes * 60))
     )
 
-    time_range = np.linspace(date2num(night.sun_set), date2num(night.sun_rise), n_steps)
-    date_range = [num2date(t) for t in time_range]
-    return date_range
+    return np.linspace(
+        datetime_to_mjd(night.sun_set), datetime_to_mjd(night.sun_rise), n_steps
+    )
+
+
+@timed_stage("calculate_moon_pars")
+def calculate_moon_pars(night_mjds, site):
+    """moon altitude, azimuth and phase for all night_mjds in one vectorized call.
+
+    Agrees with a per-sample ephem.Moon() computation within the tolerances
+    documented in the ephemeris module.
+    """
+    moon_alts, moon_azs, moon_phase = moon_alt_az_phase(
+        np.asarray(night_mjds) + MJD_OFFSET,
+        site.lat.to_value(u.deg),
+        site.lon.to_value(u.deg),
+    )
+    return moon_alts, moon_azs, moon_phase
+
 
+def setup_altaz_frame(mjds, site) -> AltAz:
+    return AltAz(obstime=Time(mjds, format="mjd", scale="utc"), location=site.location)
 
-def calculate_moon_pars(night_test_dates, night_times, site):
-    moon = ephem.Moon()
-    obs = ephem.Observer()
-    obs.lon = str(site.lon / u.deg)
-    obs.lat = str(site.lat / u.deg)
-    obs.elev = site.height / u.m
 
-    moon_alts = np.zeros_like(night_test_dates)
-    moon_azs = np.zeros_like(night_test_dates)
-    moon_phase = np.zeros_like(night_test_dates)
+@timed_stage("calculate_source_alt_az")
+def calculate_source_alt_az(ras, decs, mjds, options, site, altaz_frame=None):
+    """source altitudes and azimuths in degrees, broadcasting ras/decs against mjds.
 
-    for ii, tt in enumerate(night_times):
-        obs.date = ephem.Date(tt.datetime)
-        moon.compute(obs)
-        moon_alts[ii] = moon.alt * 180.0 / np.pi
-        moon_azs[ii] = moon.az * 180.0 / np.pi
-        moon_phase[ii] = moon.phase
+    With the "fast" ephemeris_backend no astropy frames are built, the numpy
+    implementation stays within FAST_ALTAZ_TOLERANCE_DEG of astropy.
+    """
+    if options.ephemeris_backend == "fast":
+        return source_alt_az(
+            ras,
+            decs,
+            np.asarray(mjds) + MJD_OFFSET,
+            site.lat.to_value(u.deg),
+            site.lon.to_value(u.deg),
+        )
 
-    moon_alt_az = AltAz(
-        alt=Angle(moon_alts, unit=u.deg),
-        az=Angle(moon_azs, unit=u.deg),
-        location=site.location,
-        obstime=night_times,
+    if altaz_frame is None:
+        altaz_frame = setup_altaz_frame(mjds, site)
+    source_alt_az_coords = SkyCoord(ras, decs, unit="deg").transform_to(altaz_frame)
+    return source_alt_az_coords.alt.to_value(u.deg), source_alt_az_coords.az.to_value(
+        u.deg
     )
 
-    moon_alts = moon_alt_az.alt / u.deg
 
-    return moon_alts, moon_azs, moon_phase
+def uses_moon_position(options) -> bool:
+    """True if constraints besides the moon altitude need calculate_moon_pars."""
+    return (
+        options.max_moon_phase_percent is not None
+        or options.min_moon_separation_deg is not None
+    )
+
+
+@timed_stage("calculate_sun_and_moon_alts")
+def calculate_sun_and_moon_alts(
+    night_mjds, options, site, altaz_frame=None, moon_pars=None
+):
+    """sun and moon altitudes for the night, read from the precomputed ephemeris
+    archive if one is configured and covers the night, computed live otherwise.
+    moon_pars are the calculate_moon_pars() of night_mjds, if already known."""
+    if options.ephemeris_archive:
+        archive = open_ephemeris_archive(options.ephemeris_archive)
+        if not archive.matches_site(site):
+            raise ValueError(
+                f"ephemeris archive {options.ephemeris_archive} "
+                f"was not computed for {site.name}."
+            )
+
+        if archive.covers(night_mjds):
+            sun_alts = archive.interpolate("sun_alt", night_mjds)
+            moon_alts = archive.interpolate("moon_alt", night_mjds)
+            return sun_alts, moon_alts
+
+    if options.ephemeris_backend == "fast":
+        sun_alts, _ = sun_alt_az(
+            np.asarray(night_mjds) + MJD_OFFSET,
+            site.lat.to_value(u.deg),
+            site.lon.to_value(u.deg),
+        )
+    else:
+        if altaz_frame is None:
+            altaz_frame = setup_altaz_frame(night_mjds, site)
+        sun_alts = get_sun(altaz_frame.obstime).transform_to(altaz_frame).alt / u.deg
 
+    if moon_pars is None:
+        moon_pars = calculate_moon_pars(night_mjds, site)
+    moon_alts, _, _ = moon_pars
+    return sun_alts, moon_alts
 
-def apply_criteria_to_night(science_alert, options, site, night_test_dates):
-    position = SkyCoord(
-        science_alert.coords.raInDeg, science_alert.coords.decInDeg, unit="deg"
+
+def angular_separation_deg(alt_1, az_1, alt_2, az_2):
+    alt_1, az_1, alt_2, az_2 = (np.radians(a) for a in (alt_1, az_1, alt_2, az_2))
+    cos_separation = np.sin(alt_1) * np.sin(alt_2) + np.cos(alt_1) * np.cos(
+        alt_2
+    ) * np.cos(az_1 - az_2)
+    return np.degrees(np.arccos(np.clip(cos_separation, -1.0, 1.0)))
+
+
+def site_constraint_masks(mjds, options, site, altaz_frame=None, moon_pars=None):
+    """constraints that only depend on the site and the time, shared by all alerts.
+
+    Returns:
+        Dict[str, np.ndarray]: bool mask per constraint.
+    """
+    if moon_pars is None and options.max_moon_phase_percent is not None:
+        moon_pars = calculate_moon_pars(mjds, site)
+    sun_alts, moon_alts = calculate_sun_and_moon_alts(
+        mjds, options, site, altaz_frame, moon_pars
     )
+    masks = {
+        "sun_altitude": np.asarray(sun_alts < options.max_sun_altitude_deg),
+        "moon_altitude": np.asarray(moon_alts < options.max_moon_altitude_deg),
+    }
 
-    night_times = Time(night_test_dates)
+    if options.max_moon_phase_percent is not None:
+        _, _, moon_phase = moon_pars
+        masks["moon_phase"] = moon_phase <= options.max_moon_phase_percent
 
-    altaz_frame = AltAz(obstime=night_times, location=site.location)
-    sun_alt_azs = get_sun(night_times).transform_to(altaz_frame)
-    source_alt_az = position.transform_to(altaz_frame)
+    return masks
 
-    sun_alts = sun_alt_azs.alt / u.deg
-    source_alts = source_alt_az.alt / u.deg
 
-    # other parameters might be used later to calculate the distance between
-    # moon and source and select based on  moon phase
-    moon_alts, _, _ = calculate_moon_pars(night_test_dates, night_times, site)
+def source_constraint_masks(
+    source_alts, source_azs, mjds, options, site, moon_pars=None
+):
+    """constraints that depend on the source position (broadcast over sources).
 
-    max_moon_alt = options.max_moon_altitude_deg
-    max_sun_alt = options.max_sun_altitude_deg
+    Returns:
+        Dict[str, np.ndarray]: bool mask per constraint.
+    """
     source_alt_limit = 90.0 - options.max_zenith_deg
+    masks = {"source_altitude": np.asarray(source_alts > source_alt_limit)}
+
+    if options.min_moon_separation_deg is not None:
+        if moon_pars is None:
+            moon_pars = calculate_moon_pars(mjds, site)
+        moon_alts, moon_azs, _ = moon_pars
+        separation = angular_separation_deg(
+            source_alts, source_azs, moon_alts, moon_azs
+        )
+        masks["moon_separation"] = separation >= options.min_moon_separation_deg
+
+    return masks
+
+
+def position_constraint_masks(ra_deg, dec_deg, options, site, mjds):
+    """site and source constraints of a sky position as bool masks over mjds.
+
+    Returns:
+        Dict[str, np.ndarray]: bool mask per constraint.
+    """
+    altaz_frame = None
+    if options.ephemeris_backend != "fast":
+        altaz_frame = setup_altaz_frame(mjds, site)
+
+    source_alts, source_azs = calculate_source_alt_az(
+        ra_deg, dec_deg, mjds, options, site, altaz_frame
+    )
+
+    # the moon is computed once for the site and the source constraints
+    moon_pars = calculate_moon_pars(mjds, site) if uses_moon_position(options) else None
+    masks = site_constraint_masks(mjds, options, site, altaz_frame, moon_pars)
+    masks.update(
+        source_constraint_masks(source_alts, source_azs, mjds, options, site, moon_pars)
+    )
+    metrics_registry.inc("samples_processed_total", len(mjds))
+    return masks
+
+
+@timed_stage("constraint_masks")
+def constraint_masks(science_alert, options, site, mjds):
+    """all constraints of an alert as bool masks over mjds.
+
+    Returns:
+        Dict[str, np.ndarray]: bool mask per constraint.
+    """
+    masks = position_constraint_masks(
+        science_alert.coords.raInDeg,
+        science_alert.coords.decInDeg,
+        options,
+        site,
+        mjds,
+    )
+    masks["after_alert"] = mjds > datetime_to_mjd(science_alert.alert_time)
+    return masks
+
 
-    sun_mask = sun_alts < max_sun_alt
-    source_mask = source_alts > source_alt_limit
-    moon_alt_mask = moon_alts < max_moon_alt
-    filter_mask = sun_mask & source_mask & moon_alt_mask
+def criteria_mask(science_alert, options, site, mjds) -> np.ndarray:
+    """True where all observation criteria are fulfilled at the given MJDs."""
+    masks = constraint_masks(science_alert, options, site, mjds)
+    return np.logical_and.reduce(list(masks.values()))
 
-    night_date_nums = np.array([date2num(t.datetime) for t in night_times])
-    valid_dates = night_date_nums[filter_mask]
-    good_obs_times = [num2date(d) for d in valid_dates]
 
-    return good_obs_times
+def observable_intervals(science_alert, options, site, mjds, segments=None):
+    """intersection of the interval sets of all constraints of an alert.
+
+    Args:
+        science_alert (ScienceAlert): the alert.
+        options (ObservationWindowOptions): the constraint options.
+        site (CTANorth): site of the observatory.
+        mjds (np.ndarray): sorted time grid.
+        segments (np.ndarray, optional): night id per sample of the grid.
+
+    Returns:
+        IntervalSet: the times at which the source can be observed.
+    """
+    masks = constraint_masks(science_alert, options, site, mjds)
+    return intersection(
+        *[IntervalSet.from_mask(mjds, mask, segments) for mask in masks.values()]
+    )
+
+
+def apply_criteria_to_night(science_alert, options, site, night_mjds) -> np.ndarray:
+    """MJDs of the night at which all observation criteria are fulfilled."""
+    return night_mjds[criteria_mask(science_alert, options, site, night_mjds)]
 
 
 def find_next_sun_rise_and_set(site, test_time):
     """calculates the next set and rise time of the sun with respect
-    to the alert_received_time contained in the science alert"""
-    sun = ephem.Sun()
-    obs = ephem.Observer()
-    obs.lon = str(site.lon / u.deg)
-    obs.lat = str(site.lat / u.deg)
-    obs.elev = site.height / u.m
-    obs.date = test_time
-    sun.compute(obs)
+    to the alert_received_time contained in the science alert.
+    If test_time is during the night, the previous sun-set is returned."""
+    return night_index_for_site(site).night_of(test_time)
+
+
+def make_observation_window(science_alert, start_mjd, end_mjd) -> ObservationWindow:
+    """This is the only place where datetimes are created from the time grid."""
+    alert_mjd = datetime_to_mjd(science_alert.alert_time)
+    return build_model(
+        ObservationWindow,
+        start_time=mjd_to_datetime(start_mjd),
+        end_time=mjd_to_datetime(end_mjd),
+        delay_hours=round(float(start_mjd - alert_mjd) * 24.0, 3),
+        duration_hours=round(float(end_mjd - start_mjd) * 24.0, 3),
+    )
 
-    set_time_local = obs.next_setting(sun, use_center=True).datetime()
-    rise_time_local = obs.next_rising(sun, use_center=True).datetime()
 
-    if set_time_local > rise_time_local:
-        # if the test time is during the night, use the previous sun-set instead of the next one.
-        set_time_local = obs.previous_setting(sun, use_center=True).datetime()
+def windows_from_intervals(
+    science_alert, options, intervals: IntervalSet
+) -> List[ObservationWindow]:
+    """one window per interval that is at least min_duration_minutes long."""
+    min_duration_days = options.min_duration_minutes / 60.0 / 24.0
+    return [
+        make_observation_window(science_alert, start, end)
+        for start, end in intervals.filter_min_duration(min_duration_days)
+    ]
 
-    # TODO: Make sure that UTC time is returned here.
 
-    return set_time_local.replace(tzinfo=timezone.utc), rise_time_local.replace(
-        tzinfo=timezone.utc
+@timed_stage("calculate_observation_windows")
+def calculate_observation_windows(
+    science_alert, options, site, testable_mjds_nightlist
+) -> List[ObservationWindow]:
+    """windows from the uniformly sampled nights, all nights are evaluated at once.
+    Gaps within a night (e.g. moon rise) split it into separate windows."""
+    testable_mjds_nightlist = [m for m in testable_mjds_nightlist if len(m)]
+    if not testable_mjds_nightlist:
+        return []
+
+    mjds = np.concatenate(testable_mjds_nightlist)
+    night_ids = np.repeat(
+        np.arange(len(testable_mjds_nightlist)),
+        [len(m) for m in testable_mjds_nightlist],
     )
+    intervals = observable_intervals(science_alert, options, site, mjds, night_ids)
+    return windows_from_intervals(science_alert, options, intervals)
 
 
-def calculate_observation_windows(
-    science_alert, options, site, testable_dates_nightlist
+def refine_edges(mask_function, lower, upper, lower_values, precision_days):
+    """Bisects all brackets [lower, upper] around a change of mask_function at
+    once, until every bracket is at most precision_days wide.
+
+    Args:
+        mask_function (callable): vectorized, MJDs -> bool array.
+        lower (np.ndarray): MJDs before the changes.
+        upper (np.ndarray): MJDs after the changes.
+        lower_values (np.ndarray): mask values at lower.
+        precision_days (float): requested bracket width.
+
+    Returns:
+        tuple: refined lower and upper brackets.
+    """
+    while len(lower) and np.max(upper - lower) > precision_days:
+        middle = (lower + upper) / 2.0
+        same_as_lower = mask_function(middle) == lower_values
+        lower = np.where(same_as_lower, middle, lower)
+        upper = np.where(same_as_lower, upper, middle)
+
+    return lower, upper
+
+
+@timed_stage("calculate_observation_windows_adaptive")
+def calculate_observation_windows_adaptive(
+    science_alert, options, site, nights
 ) -> List[ObservationWindow]:
-    windows = []
-    for testable_dates in testable_dates_nightlist:
-        good_times = apply_criteria_to_night(
-            science_alert, options, site, testable_dates
+    """Coarse-to-fine alternative to sampling every night at precision_minutes.
+
+    The criteria are evaluated on a grid of coarse_step_minutes for all nights
+    at once, only the samples where the mask changes are refined by bisection
+    down to precision_minutes. The cost is nearly independent of the requested
+    precision. Windows agree with the uniform search within precision_minutes,
+    but features shorter than coarse_step_minutes can be missed.
+    """
+    if not nights:
+        return []
+
+    precision_days = options.precision_minutes / 60.0 / 24.0
+    coarse_step_days = (
+        max(options.coarse_step_minutes, options.precision_minutes) / 60.0 / 24.0
+    )
+
+    def mask_function(mjds):
+        return criteria_mask(science_alert, options, site, mjds)
+
+    coarse_grids = []
+    for night in nights:
+        start = datetime_to_mjd(night.sun_set)
+        end = datetime_to_mjd(night.sun_rise)
+        n_steps = max(2, int(np.ceil((end - start) / coarse_step_days)) + 1)
+        coarse_grids.append(np.linspace(start, end, n_steps))
+
+    night_ids = np.repeat(np.arange(len(nights)), [len(g) for g in coarse_grids])
+    grid = np.concatenate(coarse_grids)
+    mask = mask_function(grid)
+
+    # only changes within a night are edges
+    edges = np.flatnonzero((mask[1:] != mask[:-1]) & (night_ids[1:] == night_ids[:-1]))
+    lower, upper = refine_edges(
+        mask_function, grid[edges], grid[edges + 1], mask[edges], precision_days
+    )
+    rising = ~mask[edges]
+
+    night_bounds = np.cumsum([0] + [len(g) for g in coarse_grids])
+    starts = np.concatenate(
+        [grid[night_bounds[:-1]][mask[night_bounds[:-1]]], upper[rising]]
+    )
+    ends = np.concatenate(
+        [grid[night_bounds[1:] - 1][mask[night_bounds[1:] - 1]], lower[~rising]]
+    )
+    # intervals are disjoint, so sorted starts and ends pair up
+    intervals = IntervalSet(np.sort(starts), np.sort(ends))
+    return windows_from_intervals(science_alert, options, intervals)
+
+
+@timed_stage("calculate_observation_windows_batch")
+def calculate_observation_windows_batch(
+    science_alerts, options, site, chunk_size: int = 256
+) -> List[List[ObservationWindow]]:
+    """Observation windows for many alerts of the same site at once.
+
+    The alerts are sorted by alert time and grouped, a group holds up to
+    chunk_size alerts received within search_range_hours of its first alert.
+    The nights of a group are sampled on one shared time grid, sun and moon are
+    evaluated once for that grid and the source altitudes of all alerts of the
+    group are computed in a single broadcasted AltAz transform. So the grid of
+    a group spans at most twice the search range, however far apart the
+    alerts of an archive are. The windows are the same as
+    calculate_observation_windows would return for each alert on its own.
+
+    Args:
+        science_alerts (List[ScienceAlert]): alerts, in any order.
+        options (ObservationWindowOptions): options shared by all alerts.
+        site (CTANorth): site of the observatory.
+        chunk_size (int): max. number of alerts per transform, bounds memory.
+
+    Returns:
+        List[List[ObservationWindow]]: the windows of each alert, in input order.
+    """
+    search_range = timedelta(hours=options.search_range_hours)
+    order = sorted(
+        range(len(science_alerts)), key=lambda i: science_alerts[i].alert_time
+    )
+
+    groups = []
+    for i_alert in order:
+        alert_time = science_alerts[i_alert].alert_time
+        if (
+            not groups
+            or len(groups[-1]) == chunk_size
+            or alert_time > science_alerts[groups[-1][0]].alert_time + search_range
+        ):
+            groups.append([])
+        groups[-1].append(i_alert)
+
+    all_windows = [None] * len(science_alerts)
+    for group in groups:
+        group_windows = observation_windows_shared_grid(
+            [science_alerts[i_alert] for i_alert in group], options, site
         )
+        for i_alert, windows in zip(group, group_windows):
+            all_windows[i_alert] = windows
 
-        times_after_alert = [t for t in good_times if t > science_alert.alert_time]
+    return all_windows
 
-        if not len(times_after_alert):
-            continue
 
-        start = times_after_alert[0]
-        end = times_after_alert[-1]
-        delay_in_hours = round(
-            (start - science_alert.alert_time).total_seconds() / 60.0 / 60.0, 3
+def observation_windows_shared_grid(
+    science_alerts, options, site
+) -> List[List[ObservationWindow]]:
+    """windows of alerts sorted by alert time, on one grid of all their nights."""
+    search_range = timedelta(hours=options.search_range_hours)
+    night_bounds = night_index_for_site(site).nights_between(
+        science_alerts[0].alert_time, science_alerts[-1].alert_time + search_range
+    )
+    nights = [make_night(sun_set, sun_rise) for sun_set, sun_rise in night_bounds]
+
+    night_grids = [setup_night_timerange(night, options) for night in nights]
+    if not sum(len(grid) for grid in night_grids):
+        return [[] for _ in science_alerts]
+
+    grid_mjds = np.concatenate(night_grids)
+    night_ids = np.repeat(np.arange(len(nights)), [len(grid) for grid in night_grids])
+    night_starts = np.array([datetime_to_mjd(night.sun_set) for night in nights])
+    night_ends = np.array([datetime_to_mjd(night.sun_rise) for night in nights])
+    search_range_days = options.search_range_hours / 24.0
+
+    altaz_frame = None
+    if options.ephemeris_backend != "fast":
+        altaz_frame = setup_altaz_frame(grid_mjds, site)
+    moon_pars = None
+    if uses_moon_position(options):
+        moon_pars = calculate_moon_pars(grid_mjds, site)
+    site_intervals = intersection(
+        *[
+            IntervalSet.from_mask(grid_mjds, mask, night_ids)
+            for mask in site_constraint_masks(
+                grid_mjds, options, site, altaz_frame, moon_pars
+            ).values()
+        ]
+    )
+
+    metrics_registry.inc("nights_evaluated_total", len(nights))
+    metrics_registry.inc(
+        "samples_processed_total", len(grid_mjds) * len(science_alerts)
+    )
+
+    source_alts, source_azs = calculate_source_alt_az(
+        np.array([alert.coords.raInDeg for alert in science_alerts])[:, np.newaxis],
+        np.array([alert.coords.decInDeg for alert in science_alerts])[:, np.newaxis],
+        grid_mjds,
+        options,
+        site,
+        altaz_frame,
+    )
+    source_masks = source_constraint_masks(
+        source_alts, source_azs, grid_mjds, options, site, moon_pars
+    )
+
+    all_windows = []
+    for i_alert, alert in enumerate(science_alerts):
+        alert_mjd = datetime_to_mjd(alert.alert_time)
+        # the nights setup_nights would return for this alert
+        in_range = (night_ends > alert_mjd) & (
+            night_starts <= alert_mjd + search_range_days
         )
-        duration_in_hours = round((end - start).total_seconds() / 60.0 / 60.0, 3)
-        windows.append(
-            ObservationWindow(
-                start_time=start,
-                end_time=end,
-                delay_hours=delay_in_hours,
-                duration_hours=duration_in_hours,
-            )
+        first_after_alert = np.searchsorted(grid_mjds, alert_mjd, side="right")
+        if not in_range.any() or first_after_alert == len(grid_mjds):
+            all_windows.append([])
+            continue
+
+        intervals = intersection(
+            site_intervals,
+            IntervalSet(night_starts[in_range], night_ends[in_range]),
+            IntervalSet([grid_mjds[first_after_alert]], [grid_mjds[-1]]),
+            *[
+                IntervalSet.from_mask(grid_mjds, mask[i_alert], night_ids)
+                for mask in source_masks.values()
+            ],
         )
+        all_windows.append(windows_from_intervals(alert, options, intervals))
 
-    return windows
+    return all_windows
 
 
 def select_observation_window(
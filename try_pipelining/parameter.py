@@ -2,7 +2,8 @@
 
 from typing import Any
 
-from try_pipelining.data_models import ParameterOptions
+from try_pipelining.data_models import ParameterFilterOptions
+from try_pipelining.filter_expressions import compile_filter_expression
 
 evaluators = {}
 
@@ -13,8 +14,13 @@ def register_evaluator(func):
 
 
 def execute_parameter_filtering(
-    parameters: dict, parameter_filtering_options: ParameterOptions
+    parameters: dict, parameter_filtering_options: ParameterFilterOptions
 ):
+    if parameter_filtering_options.expression is not None:
+        # compiled when the options were validated, this is a cache hit.
+        evaluate = compile_filter_expression(parameter_filtering_options.expression)
+        return evaluate(parameters)
+
     parameter_to_filter: str = parameter_filtering_options.parameter_name
     required_value: Any = parameter_filtering_options.parameter_requirement
     comparison_mode: str = parameter_filtering_options.parameter_comparison
@@ -1,55 +1,57 @@
-from typing import List
-
 import os
-import yaml
-from yaml.loader import SafeLoader
-
-from rich.progress import track
-from rich.tree import Tree
-from rich import print
-
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 
+from try_pipelining import metrics
+from try_pipelining.config_repository import get_config_repository
 from try_pipelining.data_models import (
     ScienceAlert,
     CTANorth,
+    ExecutionOptions,
     TaskConfig,
     ScienceAlert,
     SchedulingBlock,
     ObservationBlock,
     available_task_options,
     available_filter_options,
+    trusted_internal_data,
 )
 from try_pipelining.post_actions import (
     PostAction,
     available_post_actions,
     available_post_action_options,
 )
+from try_pipelining.events import (
+    ConsoleSink,
+    EventSink,
+    NullSink,
+    make_event,
+)
+from try_pipelining.task_cache import run_cached
+from try_pipelining.task_graph import task_dependencies, topological_order
 from try_pipelining.tasks import available_tasks, Task
 
 
 def match_science_configs(science_alert: ScienceAlert, path_to_configs: str):
-    all_cfgs = os.listdir(path_to_configs)
-    cfgs = [path_to_configs + "/" + cfg for cfg in all_cfgs]
-
-    matched_cfg_data_list = []
-    for cfg in cfgs:
-        with open(cfg, "rb") as confg_file:
-            config_data = yaml.load(confg_file, Loader=SafeLoader)
-
-        matching_reqs = config_data["alert_matching"]
-        for alert_type in matching_reqs:
-            print(alert_type, matching_reqs[alert_type])
-            req_keys = matching_reqs[alert_type]["required_keys"]
-            if all([key in science_alert.unique_id for key in req_keys]):
-                matched_cfg_data_list.append(config_data)
-
-    return matched_cfg_data_list
+    """configs matching the alert, from the (cached) repository of the directory."""
+    return get_config_repository(path_to_configs).match(science_alert)
 
 
 def parse_tasks(
     science_alert: ScienceAlert, site: CTANorth, tasks_configuration_section: dict
 ) -> List[Task]:
 
+    topological_order(task_dependencies(tasks_configuration_section))
+
     task_cfgs = [
         TaskConfig(task_name=task_name, **task_spec)
         for task_name, task_spec in tasks_configuration_section.items()
@@ -63,6 +65,8 @@ def parse_tasks(
             task_type=t.task_type,
             task_options=available_task_options[t.task_type](**t.task_options),
             filter_options=available_filter_options[t.task_type](**t.filter_options),
+            inputs=t.inputs,
+            cache=t.cache,
         )
         for t in task_cfgs
     ]
@@ -83,9 +87,56 @@ def parse_post_actions(
     return post_actions
 
 
-def execute_pipeline_from_cfg(
-    science_alert: ScienceAlert, site: CTANorth, pipeline_cfg: dict
+def make_executor(execution_options: ExecutionOptions) -> Optional[Executor]:
+    """Pool for the tasks according to the execution options of a pipeline.
+    Returns None for sequential execution."""
+    if execution_options.mode == "thread":
+        return ThreadPoolExecutor(max_workers=execution_options.max_workers)
+    if execution_options.mode == "process":
+        return ProcessPoolExecutor(max_workers=execution_options.max_workers)
+    return None
+
+
+_shared_executors: Dict[tuple, Optional[Executor]] = {}
+_shared_executors_lock = threading.Lock()
+
+
+def shared_executor(execution_options: ExecutionOptions) -> Optional[Executor]:
+    """Long lived pool of this process for the execution options.
+
+    Created on first use and reused by every later pipeline run with the same
+    mode and max_workers, starting a pool per alert costs more than the
+    tasks gain from it. Returns None for sequential execution."""
+    key = (execution_options.mode, execution_options.max_workers, os.getpid())
+    with _shared_executors_lock:
+        if key not in _shared_executors:
+            _shared_executors[key] = make_executor(execution_options)
+        return _shared_executors[key]
+
+
+def run_pipeline_from_cfg(
+    science_alert: Union[ScienceAlert, dict],
+    site: CTANorth,
+    pipeline_cfg: dict,
+    executor: Optional[Executor] = None,
+    sink: Optional[EventSink] = None,
 ):
+    """Parses and runs a pipeline configuration for an alert, headless unless
+    a sink is given.
+
+    If no executor is given, the shared_executor() of the process for the
+    optional execution section of the configuration is used. Callers running
+    many alerts can own a pool themselves and pass it in.
+
+    The alert (a ScienceAlert or its raw data) and the configuration are always
+    validated, also with trusted_internal_data.
+
+    Returns:
+        the post-action results, or None if a task did not pass.
+    """
+    if not isinstance(science_alert, ScienceAlert):
+        science_alert = ScienceAlert(**science_alert)
+
     tasks = parse_tasks(
         science_alert=science_alert,
         site=site,
@@ -99,12 +150,36 @@ def execute_pipeline_from_cfg(
 
     use_result_from = pipeline_cfg["final_result_from"]
 
-    results = run_pipeline(
+    execution_options = ExecutionOptions(**pipeline_cfg.get("execution", {}))
+    if executor is None:
+        executor = shared_executor(execution_options)
+
+    return run_pipeline(
         tasks=tasks,
         return_result=use_result_from,
         post_actions=post_actions,
+        executor=executor,
+        early_abort=execution_options.early_abort,
+        sink=sink if sink is not None else NullSink(),
+        trust_internal_data=execution_options.trusted_internal_data,
+        max_in_flight=execution_options.max_workers,
     )
 
+
+def execute_pipeline_from_cfg(
+    science_alert: Union[ScienceAlert, dict],
+    site: CTANorth,
+    pipeline_cfg: dict,
+    executor: Optional[Executor] = None,
+    sink: Optional[EventSink] = None,
+):
+    """Runs a pipeline configuration for an alert and reports the results.
+
+    Events go to the sink, by default rendered on the console with rich.
+    """
+    sink = sink if sink is not None else ConsoleSink()
+    results = run_pipeline_from_cfg(science_alert, site, pipeline_cfg, executor, sink)
+
     try:
         sb = results["CreateWobbleSchedulingBlock"]
         assert isinstance(sb, SchedulingBlock)
@@ -112,80 +187,250 @@ def execute_pipeline_from_cfg(
         for ob in obs:
             assert isinstance(ob, ObservationBlock)
 
-        print("[bold blue]--- RESULTS ---")
-        print(f"[blue] got {type(sb).__name__}:")
-        print(sb.dict())
-        print(f"[blue] got {len(obs)} {type(obs[0]).__name__}s:")
-        for i, r in enumerate(obs):
-            assert isinstance(r, ObservationBlock)
-            print(f"[bold blue] {type(r).__name__} {i}:")
-            print(r.dict())
-
     except Exception as e:
-        print("No valid results")
+        sink(make_event("no_results"))
         raise e
 
-    print("[bold blue]--------------")
+    sink(make_event("results", results=results))
     return results
 
 
+# smoothing of the measured run times per task type.
+TASK_COST_SMOOTHING = 0.2
+# with early_abort, tasks estimated to run longer are only started once no
+# cheaper task is running or ready, i.e. after the cheap filters passed.
+EXPENSIVE_TASK_COST_S = 0.05
+
+_measured_task_costs: Dict[str, float] = {}
+_measured_task_costs_lock = threading.Lock()
+
+
+def record_task_cost(task_type: str, seconds: float):
+    """updates the running average of the run time of a task type."""
+    with _measured_task_costs_lock:
+        previous = _measured_task_costs.get(task_type)
+        if previous is None:
+            _measured_task_costs[task_type] = seconds
+        else:
+            _measured_task_costs[task_type] = previous + TASK_COST_SMOOTHING * (
+                seconds - previous
+            )
+
+
+def estimated_task_cost(task: Task) -> float:
+    """measured average run time of the task type, or the task's own estimate."""
+    return _measured_task_costs.get(task.task_type, task.estimated_cost_s)
+
+
+class TaskOutcome(NamedTuple):
+    filtered_result: Any
+    passed: bool
+    seconds: float
+    cpu_seconds: float
+    # counters of a task run in a worker process, see run_task
+    worker_metrics: Optional[dict] = None
+
+
+def run_task(
+    task: Task, trust_internal_data: bool = False, collect_metrics: bool = False
+) -> TaskOutcome:
+    """Runs and filters a single task.
+
+    Module level function, so that it can be used with process pools. The
+    passed state is returned explicitly, as the task might be a copy. With
+    collect_metrics (for process pools) the counters of the task, e.g. of the
+    observation window stages, are collected and returned instead of counted
+    into the registry of the worker process."""
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    worker_metrics = None
+    with trusted_internal_data(trust_internal_data):
+        if collect_metrics:
+            with metrics.registry.collecting() as worker_metrics:
+                filtered_result = task.filter(result=run_cached(task))
+        else:
+            filtered_result = task.filter(result=run_cached(task))
+    return TaskOutcome(
+        filtered_result,
+        task.passed,
+        time.perf_counter() - start,
+        time.thread_time() - cpu_start,
+        worker_metrics,
+    )
+
+
+def record_task_metrics(task: Task, outcome: TaskOutcome):
+    """task timer and outcome, counted where the pipeline runs."""
+    metrics.registry.add_timing(
+        "task", outcome.seconds, outcome.cpu_seconds, task=task.task_name
+    )
+    metrics.registry.inc(
+        "task_outcomes_total", task=task.task_name, passed=str(outcome.passed).lower()
+    )
+    if outcome.worker_metrics:
+        metrics.registry.merge(outcome.worker_metrics)
+
+
+class InlineExecutor(Executor):
+    """Executor running every submitted function right away, in the caller."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def schedule_tasks(
+    tasks: List[Task],
+    executor: Optional[Executor] = None,
+    early_abort: bool = True,
+    sink: Optional[EventSink] = None,
+    trust_internal_data: bool = False,
+    max_in_flight: Optional[int] = None,
+):
+    """Runs the task graph, yields (task, TaskOutcome) as tasks finish.
+
+    A task is started once all of its inputs passed, cheapest ready task
+    first, with the input results handed over by reference. Without an
+    executor one task runs at a time, with one at most max_in_flight (e.g. the
+    max_workers of the execution options; default: all tasks, the pool queues
+    what exceeds its workers). Tasks depending on a failed task are never
+    started. With early_abort tasks above EXPENSIVE_TASK_COST_S wait until
+    no cheaper task is running or ready, nothing new is started after the
+    first failure and pending futures are cancelled. A task_started event is
+    sent to the sink for every started task. With trust_internal_data the task
+    results are built without validation.
+    """
+    sink = sink if sink is not None else NullSink()
+    collect_metrics = metrics.registry.enabled and isinstance(
+        executor, ProcessPoolExecutor
+    )
+    if executor is None:
+        in_flight_limit = 1
+        executor = InlineExecutor()
+    else:
+        in_flight_limit = max_in_flight or len(tasks)
+
+    pending = {t.task_name: t for t in tasks}
+    passed_results = {}
+    running = {}
+    while pending or running:
+        ready = sorted(
+            (
+                t
+                for t in pending.values()
+                if all(name in passed_results for name in t.inputs)
+            ),
+            key=estimated_task_cost,
+        )
+        if early_abort:
+            cheap_outstanding = any(
+                estimated_task_cost(t) <= EXPENSIVE_TASK_COST_S
+                for t in list(running.values()) + ready
+            )
+            if cheap_outstanding:
+                ready = [
+                    t for t in ready if estimated_task_cost(t) <= EXPENSIVE_TASK_COST_S
+                ]
+
+        for t in ready[: max(in_flight_limit - len(running), 0)]:
+            del pending[t.task_name]
+            t.input_results = {name: passed_results[name] for name in t.inputs}
+            sink(make_event("task_started", t.task_name))
+            running[
+                executor.submit(run_task, t, trust_internal_data, collect_metrics)
+            ] = t
+
+        if not running:
+            return
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            t = running.pop(future)
+            outcome = future.result()
+            yield t, outcome
+
+            if outcome.passed:
+                passed_results[t.task_name] = outcome.filtered_result
+            elif early_abort:
+                for other in running:
+                    other.cancel()
+                return
+
+
 def run_pipeline(
     tasks: List[Task],
     return_result: str,
     post_actions: List[PostAction],
+    executor: Optional[Executor] = None,
+    early_abort: bool = True,
+    sink: Optional[EventSink] = None,
+    trust_internal_data: bool = False,
+    max_in_flight: Optional[int] = None,
 ):
-    """The Actial Pipeline function."""
+    """The Actial Pipeline function.
+
+    Tasks are scheduled by schedule_tasks(): along their dependencies,
+    cheapest first (by measured or estimated cost) and concurrently if an
+    executor (thread or process pool) is given, at most max_in_flight at a
+    time (default: no limit). Tasks that did not run are reported as skipped. The report stays in configuration order.
+
+    Progress and reports are sent as events to the sink, by default rendered
+    on the console with rich. Use e.g. a NullSink to run headless.
 
-    # Translate from task configs to Task Implementations
+    With trust_internal_data the models produced by the tasks and post-actions
+    are not validated again (see data_models.build_model).
+    """
+    sink = sink if sink is not None else ConsoleSink()
 
     task_results = {}
-    tasks_passed = []
-    tasks_report = []
-
-    for t in track(
-        tasks,
-        description="[bold blue]+Running Tasks...",
-        total=len(tasks),
-    ):
-        # --- run and filter the result ---
-        filtered_results = t.filter(result=t.run())
-
-        # --- Add to the Results Dict ---
-        task_results[t.task_name] = filtered_results
-        tasks_passed.append(t.passed)
-
-        rep_task = f"[bold green]PASS" if t.passed else f"[bold red]FAIL"
-        tasks_report.append(f"{t.task_name} - {rep_task}")
-
-    task_tree = Tree("[bold Blue]+Tasks report:", highlight=True)
-    [task_tree.add(rep) for rep in tasks_report]
-    print(task_tree)
-
-    if False in tasks_passed:
-        print(
-            "[bold red]Some Tasks failed... -> No valid result returned from Pipeline."
-        )
-        print(
-            "[bold red]Nothing more do be done here ... ",
-            ":frowning_face_with_open_mouth:",
-        )
+    task_status = {t.task_name: "SKIP" for t in tasks}
+
+    sink(make_event("tasks_started", n_tasks=len(tasks)))
+    try:
+        for t, outcome in schedule_tasks(
+            tasks, executor, early_abort, sink, trust_internal_data, max_in_flight
+        ):
+            t.passed = outcome.passed
+            record_task_cost(t.task_type, outcome.seconds)
+            record_task_metrics(t, outcome)
+
+            # --- Add to the Results Dict ---
+            task_results[t.task_name] = outcome.filtered_result
+            task_status[t.task_name] = "PASS" if t.passed else "FAIL"
+            sink(
+                make_event(
+                    "task_finished",
+                    t.task_name,
+                    passed=outcome.passed,
+                    seconds=outcome.seconds,
+                )
+            )
+    finally:
+        sink(make_event("tasks_report", status=task_status))
+
+    if any(status != "PASS" for status in task_status.values()):
+        sink(make_event("pipeline_rejected"))
         return
 
     # The task result that is specified to be used further.
     result = task_results[return_result]
 
-    post_action_tree = Tree("[bold Blue]+Post-action report:", highlight=True)
     # a dict of the post-action results for logging and reporting purposes.
     post_action_results = {return_result: result}
-    for post_action in track(
-        post_actions,
-        description="[bold blue]+Executing Post-action",
-        total=len(post_actions),
-    ):
-        # results are chained in order of post action specificiation in the configuration
-        result = post_action.run(task_result=result)
-        post_action_results.update({post_action.action_type: result})
-        post_action_tree.add(post_action.action_type + "[bold green] DONE")
-
-    print(post_action_tree)
+    sink(make_event("post_actions_started", n_post_actions=len(post_actions)))
+    try:
+        for post_action in post_actions:
+            # results are chained in order of post action specificiation in the configuration
+            with metrics.registry.timer("post_action", action=post_action.action_type):
+                with trusted_internal_data(trust_internal_data):
+                    result = post_action.run(task_result=result)
+            post_action_results.update({post_action.action_type: result})
+            sink(make_event("post_action_done", post_action.action_type))
+    finally:
+        sink(make_event("post_actions_report"))
+
     return post_action_results
@@ -1,21 +1,19 @@
-from datetime import datetime, timedelta
-from math import floor
-from itertools import cycle
+from datetime import datetime
+from math import floor, gcd
 
-from typing import List, Any, Union
+from typing import List, Any, Sequence, Union
 from pydantic import BaseModel, Field, root_validator
 
-from astropy.coordinates import SkyCoord
-from astropy import units as u
-
 from try_pipelining.data_models import (
     ScienceAlert,
     SchedulingBlock,
     ObservationBlock,
     Coords,
+    ObservationWindow,
+    TimeConstraints,
     WobbleOptions,
+    build_model,
 )
-from try_pipelining.observation_windows import ObservationWindow
 
 available_post_actions = {}
 available_post_action_options = {}
@@ -87,21 +85,34 @@ class PostAction:
 class CreateWobbleSchedulingBlock(PostAction):
     def run(self, task_result: ObservationWindow) -> SchedulingBlock:
         action_options: CreateWobbleSchedulingBlockOptions = self.action_options
-        sb_dict = {
-            "coords": self.science_alert.coords,
-            "time_constraints": {
-                "start_time": task_result.start_time,
-                "end_time": task_result.end_time,
-            },
-            "wobble_options": action_options.wobble,
-            "proposal": action_options.proposal,
-        }
-        return SchedulingBlock(**sb_dict)
+        return build_model(
+            SchedulingBlock,
+            coords=self.science_alert.coords,
+            time_constraints=build_model(
+                TimeConstraints,
+                start_time=task_result.start_time,
+                end_time=task_result.end_time,
+            ),
+            wobble_options=build_model(
+                WobbleOptions,
+                offsets=list(action_options.wobble.offsets),
+                angles=list(action_options.wobble.angles),
+            ),
+        )
 
 
 @register_post_action
 class CreateObservationBlocks(PostAction):
-    def run(self, task_result: SchedulingBlock) -> List[ObservationBlock]:
+    def run(self, task_result: SchedulingBlock) -> Sequence[ObservationBlock]:
+        import numpy as np
+        from astropy import units as u
+        from astropy.coordinates import SkyCoord
+
+        from try_pipelining.observation_blocks import (
+            ObservationBlockBatch,
+            to_utc_datetime64,
+        )
+
         base_target_coords: Coords = task_result.coords
         sb_start: datetime = task_result.time_constraints.start_time
         sb_end: datetime = task_result.time_constraints.end_time
@@ -118,36 +129,37 @@ class CreateObservationBlocks(PostAction):
         #  TODO: get the optimal number of observation blocks (i.e. symetrical and not too short)
         #  going with max number of blocks for now...
 
-        cycle_wobble_offset = cycle(wobble_opts.offsets)
-        cycle_wobble_angles = cycle(wobble_opts.angles)
+        # the wobble pattern cycles, so only its distinct positions are computed,
+        # all at once. Block i uses pattern position i % n_positions.
+        n_offsets, n_angles = len(wobble_opts.offsets), len(wobble_opts.angles)
+        n_positions = n_offsets * n_angles // gcd(n_offsets, n_angles)
+        pattern = np.arange(n_positions)
         base_target = SkyCoord(
             ra=base_target_coords.raInDeg * u.deg,
             dec=base_target_coords.decInDeg * u.deg,
             frame="fk5",
         )
+        wobble_positions = base_target.directional_offset_by(
+            position_angle=np.take(wobble_opts.angles, pattern, mode="wrap") * u.deg,
+            separation=np.take(wobble_opts.offsets, pattern, mode="wrap") * u.deg,
+        )
+        ras = wobble_positions.ra.to_value(u.deg)
+        decs = wobble_positions.dec.to_value(u.deg)
+        ras = np.where(ras > 0, ras, ras + 180)
+        decs = np.where(decs > 0, decs, decs + 180)
 
-        obs = []
-        for i in range(n_blocks_max):
-            coord_with_offset = base_target.directional_offset_by(
-                position_angle=next(cycle_wobble_angles) * u.deg,
-                separation=next(cycle_wobble_offset) * u.deg,
-            )
-            ra = coord_with_offset.ra / u.deg
-            dec = coord_with_offset.dec / u.deg
-            ra_in_deg = ra if ra > 0 else ra + 180
-            dec_in_deg = dec if dec > 0 else dec + 180
-
-            obs.append(
-                ObservationBlock(
-                    start_time=sb_start
-                    + timedelta(minutes=i * action_options.min_block_duration_minutes),
-                    end_time=sb_start
-                    + timedelta(
-                        minutes=(i + 1) * action_options.min_block_duration_minutes
-                    ),
-                    ra_target_deg=ra_in_deg,
-                    dec_target_deg=dec_in_deg,
-                )
-            )
-
-        return obs
+        block_minutes = (
+            np.arange(n_blocks_max + 1) * action_options.min_block_duration_minutes
+        )
+        block_edges = to_utc_datetime64([sb_start]) + np.round(
+            block_minutes * 60e6
+        ).astype("timedelta64[us]")
+        pattern_index = np.arange(n_blocks_max) % n_positions
+
+        return ObservationBlockBatch(
+            start_times=block_edges[:-1],
+            end_times=block_edges[1:],
+            ra_target_deg=ras[pattern_index],
+            dec_target_deg=decs[pattern_index],
+            tzinfo=sb_start.tzinfo,
+        )
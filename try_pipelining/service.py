@@ -0,0 +1,235 @@
+"""
+long running alert ingestion service
+alerts (one JSON ScienceAlert per line) are read from a local stream, queued in
+a bounded queue and processed by at most max_in_flight pipelines at a time on a
+process pool. When the queue is full, reading from the stream pauses, so a
+burst of alerts is worked off in order instead of piling up in memory. One JSON
+line with the results and timings of every alert is written to the output.
+
+Start it with e.g.:
+    python -m try_pipelining.service configs/ --tcp-port 8765
+    python -m try_pipelining.service configs/ --jsonl alerts.jsonl --follow
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, TextIO
+
+from try_pipelining.data_models import CTANorth, ScienceAlert
+from try_pipelining.events import json_default
+from try_pipelining.pipelines import match_science_configs, run_pipeline_from_cfg
+
+# how often a followed file is checked for new lines.
+FOLLOW_POLL_INTERVAL_S = 0.5
+
+
+def to_jsonable(results):
+    """pipeline results (pydantic models, datetimes, ...) as plain JSON types."""
+    return json.loads(json.dumps(results, default=json_default))
+
+
+def process_alert(
+    alert_data: dict, path_to_configs: str, executor: Optional[Executor] = None
+) -> dict:
+    """Runs all pipelines matching an alert, headless.
+
+    The tasks run on the given executor, by default on the long lived
+    shared_executor() of the (worker) process for the execution options.
+
+    Returns:
+        dict: JSON-able summary with the results of every matched pipeline
+            (None if it did not pass) and the run time.
+    """
+    start = time.perf_counter()
+    science_alert = ScienceAlert(**alert_data)
+    site = CTANorth()
+
+    pipelines = []
+    for config_data in match_science_configs(science_alert, path_to_configs):
+        pipeline_cfg = config_data["pipeline"]
+        results = run_pipeline_from_cfg(science_alert, site, pipeline_cfg, executor)
+        pipelines.append(
+            {
+                "final_result_from": pipeline_cfg["final_result_from"],
+                "passed": results is not None,
+                "results": to_jsonable(results),
+            }
+        )
+
+    return {
+        "unique_id": science_alert.unique_id,
+        "pipelines": pipelines,
+        "run_s": time.perf_counter() - start,
+    }
+
+
+class AlertService:
+    """Queues incoming alerts and runs their pipelines concurrently.
+
+    Args:
+        path_to_configs (str): directory with the pipeline configurations.
+        output (TextIO): stream the JSON result lines are written to.
+        executor (Executor, optional): pool the pipelines are run on. Defaults
+            to a process pool with max_in_flight workers.
+        max_in_flight (int): alerts processed at the same time.
+        queue_size (int): alerts waiting at most, before reading pauses.
+    """
+
+    def __init__(
+        self,
+        path_to_configs: str,
+        output: TextIO,
+        executor: Optional[Executor] = None,
+        max_in_flight: int = 4,
+        queue_size: int = 64,
+    ):
+        if max_in_flight < 1 or queue_size < 1:
+            raise ValueError("max_in_flight and queue_size should be at least 1.")
+
+        self.path_to_configs = path_to_configs
+        self.output = output
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers = []
+
+    def emit(self, record: dict):
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+
+    async def start(self):
+        """creates the queue and the workers, on the running event loop."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_in_flight)
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.ensure_future(self._work()) for _ in range(self.max_in_flight)
+        ]
+
+    async def stop(self):
+        """waits for all queued alerts, then stops the workers."""
+        await self.queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def submit(self, line: str):
+        """queues one alert line, waits while the queue is full."""
+        line = line.strip()
+        if not line:
+            return
+        try:
+            alert_data = json.loads(line)
+        except ValueError as e:
+            self.emit({"error": f"invalid alert line: {e}"})
+            return
+        await self.queue.put((alert_data, time.monotonic()))
+
+    async def _work(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            alert_data, queued_at = await self.queue.get()
+            started_at = time.monotonic()
+            try:
+                record = await loop.run_in_executor(
+                    self.executor, process_alert, alert_data, self.path_to_configs
+                )
+            except Exception as e:
+                record = {"unique_id": alert_data.get("unique_id"), "error": repr(e)}
+            record["queued_s"] = started_at - queued_at
+            record["total_s"] = time.monotonic() - queued_at
+            self.emit(record)
+            self.queue.task_done()
+
+    async def read_stream(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            await self.submit(line.decode())
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            await self.read_stream(reader)
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, port: int, host: str = "127.0.0.1"):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_unix(self, path: str):
+        server = await asyncio.start_unix_server(self._handle_connection, path)
+        async with server:
+            await server.serve_forever()
+
+    async def read_jsonl(self, path: str, follow: bool = False):
+        """reads an alert file, with follow like `tail -f` (it never returns)."""
+        with open(path) as alert_file:
+            while True:
+                line = alert_file.readline()
+                if line:
+                    await self.submit(line)
+                elif follow:
+                    await asyncio.sleep(FOLLOW_POLL_INTERVAL_S)
+                else:
+                    return
+
+
+async def run_service(service: AlertService, source):
+    """starts the service, feeds it from the source coroutine and drains it."""
+    await service.start()
+    try:
+        await source
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the matching pipelines for a stream of alerts."
+    )
+    parser.add_argument("configs", help="directory with pipeline configurations")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tcp-port", type=int, help="listen on localhost")
+    source.add_argument("--unix-socket", help="listen on a unix socket")
+    source.add_argument("--jsonl", help="read alerts from a JSON lines file")
+    parser.add_argument("--follow", action="store_true", help="tail the --jsonl file")
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--output", help="result file, default: stdout")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "a") if args.output else sys.stdout
+    service = AlertService(
+        args.configs,
+        output,
+        max_in_flight=args.max_in_flight,
+        queue_size=args.queue_size,
+    )
+
+    if args.tcp_port is not None:
+        source = service.serve_tcp(args.tcp_port)
+    elif args.unix_socket is not None:
+        source = service.serve_unix(args.unix_socket)
+    else:
+        source = service.read_jsonl(args.jsonl, follow=args.follow)
+
+    try:
+        asyncio.run(run_service(service, source))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
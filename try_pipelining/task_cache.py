@@ -0,0 +1,160 @@
+"""
+in-memory cache of task results
+GCN sends several notices per burst, with the same or refined coordinates.
+Task.run() results are memoized on the task type, the task options, the site
+and only those alert fields the task declares in cache_alert_fields, with the
+coordinates quantized to coord_tolerance_deg. Tasks that do not declare any
+fields (cheap ones) or have cache set to False in the config are not cached.
+Results built without validation (trusted_internal_data) are kept apart from
+validated ones.
+
+The observation window task keeps its alert independent night intervals in
+the same cache instead, see window_store.MemoryWindowStore.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from pydantic import BaseModel
+
+from try_pipelining.data_models import Coords, internal_data_trusted
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL_S = 3600.0
+DEFAULT_COORD_TOLERANCE_DEG = 0.01
+
+
+class TaskResultCache:
+    """Thread safe LRU cache with a time to live for every entry.
+
+    Args:
+        max_size (int): entries kept at most, the least recently used go first.
+        ttl_s (float): entries expire this long after they were stored.
+        coord_tolerance_deg (float): quantization of the alert coordinates.
+        clock (Callable): time source in seconds.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        ttl_s: float = DEFAULT_CACHE_TTL_S,
+        coord_tolerance_deg: float = DEFAULT_COORD_TOLERANCE_DEG,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.coord_tolerance_deg = coord_tolerance_deg
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _alert_field_key(self, value) -> Hashable:
+        if isinstance(value, Coords):
+            return (
+                round(value.raInDeg / self.coord_tolerance_deg),
+                round(value.decInDeg / self.coord_tolerance_deg),
+            )
+        if isinstance(value, BaseModel):
+            return value.json()
+        if isinstance(value, dict):
+            return json.dumps(value, sort_keys=True, default=str)
+        return value
+
+    def key(self, task) -> Optional[Hashable]:
+        """cache key of a task, None if the task is not cacheable.
+
+        Tasks with inputs are never cached, their result depends on them."""
+        if not task.cache or task.cache_alert_fields is None or task.inputs:
+            return None
+
+        site = task.site
+        return (
+            task.task_type,
+            task.task_options.json(),
+            site.lat_deg,
+            site.lon_deg,
+            site.height_m,
+            internal_data_trusted(),
+            tuple(
+                self._alert_field_key(getattr(task.science_alert, field))
+                for field in task.cache_alert_fields
+            ),
+        )
+
+
+# the cache of this process, shared by all pipelines.
+task_result_cache = TaskResultCache()
+
+
+def configure_task_cache(
+    max_size: int = DEFAULT_CACHE_SIZE,
+    ttl_s: float = DEFAULT_CACHE_TTL_S,
+    coord_tolerance_deg: float = DEFAULT_COORD_TOLERANCE_DEG,
+) -> TaskResultCache:
+    """replaces the process wide cache with a fresh, empty one."""
+    global task_result_cache
+    task_result_cache = TaskResultCache(max_size, ttl_s, coord_tolerance_deg)
+    return task_result_cache
+
+
+def run_cached(task, cache: Optional[TaskResultCache] = None):
+    """task.run(), memoized in the cache (default: the process wide one).
+
+    Cached results are shared between alerts and should be treated read-only.
+    """
+    cache = cache if cache is not None else task_result_cache
+    key = cache.key(task)
+    if key is None:
+        return task.run()
+
+    result = cache.get(key)
+    if result is None:
+        result = task.run()
+        if result is not None:
+            cache.put(key, result)
+    return result
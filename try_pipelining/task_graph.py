@@ -0,0 +1,51 @@
+"""
+dependency graph of the tasks of a pipeline
+a task can consume the (filtered) results of other tasks by listing them in its
+`inputs`. The graph is checked when a configuration is loaded, so a pipeline
+with unknown inputs or cyclic dependencies is rejected before it ever runs.
+"""
+
+from typing import Dict, List
+
+
+def task_dependencies(tasks_configuration_section: dict) -> Dict[str, List[str]]:
+    """inputs of every task of a tasks section, in configuration order."""
+    return {
+        task_name: list((task_spec or {}).get("inputs", []))
+        for task_name, task_spec in tasks_configuration_section.items()
+    }
+
+
+def topological_order(dependencies: Dict[str, List[str]]) -> List[str]:
+    """Orders the tasks so that every task comes after all of its inputs.
+
+    Ties are broken by configuration order. Raises ValueError for inputs that
+    are no task and for cyclic dependencies.
+    """
+    for task_name, inputs in dependencies.items():
+        for input_name in inputs:
+            if input_name not in dependencies:
+                raise ValueError(f"{task_name}: input {input_name} is not a task.")
+            if input_name == task_name:
+                raise ValueError(f"{task_name} can not be its own input.")
+
+    n_missing = {
+        task_name: len(set(inputs)) for task_name, inputs in dependencies.items()
+    }
+    dependents: Dict[str, List[str]] = {task_name: [] for task_name in dependencies}
+    for task_name, inputs in dependencies.items():
+        for input_name in set(inputs):
+            dependents[input_name].append(task_name)
+
+    order = [task_name for task_name, n in n_missing.items() if n == 0]
+    for task_name in order:
+        for dependent in dependents[task_name]:
+            n_missing[dependent] -= 1
+            if n_missing[dependent] == 0:
+                order.append(dependent)
+
+    if len(order) != len(dependencies):
+        cyclic = [task_name for task_name in dependencies if task_name not in order]
+        raise ValueError(f"cyclic task dependencies between {', '.join(cyclic)}.")
+
+    return order
@@ -1,21 +1,17 @@
-from typing import Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from try_pipelining import parameter
 from try_pipelining.data_models import (
     FactorialsTaskResult,
     ObservationWindowTaskResult,
+    ObservationWindow,
     ParameterResult,
     available_task_options,
+    build_model,
     available_filter_options,
 )
 from try_pipelining.factorials import factorial
-from try_pipelining.observation_windows import (
-    ObservationWindow,
-    calculate_observation_windows,
-    select_observation_window,
-    setup_night_timerange,
-    setup_nights,
-)
+from try_pipelining.filter_expressions import FilterExpressionError
 
 available_tasks = {}
 
@@ -31,10 +27,30 @@ class Task:
     Implementations need to define both the run() and the filter() method.
 
     If the filter() method is passed correctly, the implementation needs
-    to set it to true."""
+    to set it to true.
+
+    estimated_cost_s is a rough guess of the run time, used to run cheap tasks
+    first until actual run times have been measured.
+
+    The filtered results of the tasks listed in inputs are available in
+    input_results (by task name) when run() is called.
+
+    Results of run() are cached (see task_cache) for tasks that declare the
+    alert fields they depend on in cache_alert_fields, unless cache is False."""
+
+    estimated_cost_s: float = 1.0
+    cache_alert_fields: Optional[Tuple[str, ...]] = None
 
     def __init__(
-        self, science_alert, site, task_name, task_type, task_options, filter_options
+        self,
+        science_alert,
+        site,
+        task_name,
+        task_type,
+        task_options,
+        filter_options,
+        inputs=(),
+        cache=True,
     ):
         self.science_alert = science_alert
         self.site = site
@@ -42,6 +58,9 @@ class Task:
         self.task_type: str = task_type
         self.task_options = task_options
         self.filter_options = filter_options
+        self.inputs: List[str] = list(inputs)
+        self.input_results: Dict[str, Any] = {}
+        self.cache = cache
         self.passed = False
         self.validate()
 
@@ -64,10 +83,13 @@ class Task:
 class FactorialsTask(Task):
     """Task implementation that calculates a factorial and filters based the resulting value."""
 
+    estimated_cost_s = 1e-4
+
     def run(self):
         """Calculation of the factorial."""
-        return FactorialsTaskResult(
-            factorial_result=factorial(self.task_options.fact_n)
+        return build_model(
+            FactorialsTaskResult,
+            factorial_result=float(factorial(self.task_options.fact_n)),
         )
 
     def filter(self, result: FactorialsTaskResult) -> Union[FactorialsTaskResult, None]:
@@ -81,23 +103,71 @@ class FactorialsTask(Task):
 
 @register_task
 class ObservationWindowTask(Task):
-    """Pipeline Implementation that calculates observation Windows and filters them."""
+    """Pipeline Implementation that calculates observation Windows and filters them.
+
+    The alert independent night intervals are cached (in the window_store or
+    in memory) and the alert time cut is applied afterwards, so follow-up
+    notices of a source reuse them. Adaptive searches are only cached as whole
+    results, for repeated notices with the same alert time."""
+
+    estimated_cost_s = 0.5
+
+    @property
+    def cache_alert_fields(self):
+        if self.task_options.search_mode == "adaptive":
+            return ("coords", "alert_time")
+        return None
 
     def run(self):
         """Calculation of the Observation Windows according to the options."""
+        # astropy and ephem are only imported once this task is actually run.
+        from try_pipelining.observation_windows import (
+            calculate_observation_windows,
+            calculate_observation_windows_adaptive,
+            setup_night_timerange,
+            setup_nights,
+        )
+        from try_pipelining.window_store import (
+            MemoryWindowStore,
+            calculate_observation_windows_stored,
+            open_window_store,
+        )
+
         nights = setup_nights(self.science_alert, self.task_options, self.site)
-        testable_dates_nightlist = [
+
+        if self.task_options.search_mode == "adaptive":
+            observation_windows = calculate_observation_windows_adaptive(
+                self.science_alert, self.task_options, self.site, nights
+            )
+            return build_model(ObservationWindowTaskResult, windows=observation_windows)
+
+        if self.task_options.window_store is not None:
+            store = open_window_store(self.task_options.window_store)
+        elif self.cache:
+            store = MemoryWindowStore()
+        else:
+            store = None
+
+        if store is not None:
+            observation_windows = calculate_observation_windows_stored(
+                self.science_alert, self.task_options, self.site, nights, store
+            )
+            return build_model(ObservationWindowTaskResult, windows=observation_windows)
+
+        testable_mjds_nightlist = [
             setup_night_timerange(night, self.task_options) for night in nights
         ]
         observation_windows = calculate_observation_windows(
-            self.science_alert, self.task_options, self.site, testable_dates_nightlist
+            self.science_alert, self.task_options, self.site, testable_mjds_nightlist
         )
-        return ObservationWindowTaskResult(windows=observation_windows)
+        return build_model(ObservationWindowTaskResult, windows=observation_windows)
 
     def filter(
         self, result: ObservationWindowTaskResult
     ) -> Union[ObservationWindow, None]:
         """Filters and selectes Observation Windows according to filtering options."""
+        from try_pipelining.observation_windows import select_observation_window
+
         assert isinstance(result, ObservationWindowTaskResult)
 
         filtered_windows = []
@@ -122,19 +192,28 @@ class ObservationWindowTask(Task):
 class ParameterTask(Task):
     """Pipeline Implementation that only filters parameters of the alert."""
 
+    estimated_cost_s = 1e-5
+
     def run(self):
         """Nothing to be done here."""
         return None
 
     def filter(self, result: None) -> ParameterResult:
-        """Checks that the alert parmaeter machtes the requirement specified in the filter options."""
+        """Checks that the alert parmaeter machtes the requirement specified in the filter options.
+
+        Parameters that cannot be compared with the requirement fail the task."""
 
         pars: dict = self.science_alert.measured_parameters
-        passed = parameter.execute_parameter_filtering(pars, self.filter_options)
+        try:
+            passed = parameter.execute_parameter_filtering(pars, self.filter_options)
+        except FilterExpressionError:
+            passed = False
         if passed:
             self.passed = True
 
-        return ParameterResult(
-            parameter_name=self.filter_options.parameter_name,
-            parameter_ok=passed,
+        return build_model(
+            ParameterResult,
+            parameter_name=self.filter_options.parameter_name
+            or self.filter_options.expression,
+            parameter_ok=bool(passed),
         )
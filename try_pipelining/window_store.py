@@ -0,0 +1,287 @@
+"""
+persistent store of observable intervals per source position and night
+the expensive part of an ObservationWindowTask, the site and source constraints
+of a night, does not depend on the alert time. Those intervals are kept in a
+SQLite database (WAL mode, safe for several worker processes of a host), keyed
+by site, quantized coordinates, night and the options they depend on, so they
+survive restarts. The alert dependent cut and the windows are derived from them.
+Without a database, MemoryWindowStore keeps them in the in-memory task cache,
+so follow-up notices of a source reuse them within a process.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from astropy import units as u
+
+from try_pipelining import task_cache
+from try_pipelining.ephemeris import datetime_to_mjd
+from try_pipelining.intervals import IntervalSet, intersection
+from try_pipelining.metrics import timed_stage
+from try_pipelining.observation_windows import (
+    Night,
+    ObservationWindow,
+    position_constraint_masks,
+    setup_night_timerange,
+    windows_from_intervals,
+)
+
+DEFAULT_COORD_TOLERANCE_DEG = 0.01
+# waiting time for the lock of another process writing to the store.
+BUSY_TIMEOUT_S = 30.0
+
+# options that only act on the alert dependent part of the search.
+ALERT_DEPENDENT_OPTIONS = {
+    "search_range_hours",
+    "min_delay_minutes",
+    "max_delay_minutes",
+    "min_duration_minutes",
+    "search_mode",
+    "coarse_step_minutes",
+    "window_store",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS night_intervals (
+    site TEXT NOT NULL,
+    ra_q INTEGER NOT NULL,
+    dec_q INTEGER NOT NULL,
+    evening_date TEXT NOT NULL,
+    options TEXT NOT NULL,
+    starts BLOB NOT NULL,
+    ends BLOB NOT NULL,
+    PRIMARY KEY (site, ra_q, dec_q, evening_date, options)
+)
+"""
+
+
+def _site_key(site) -> str:
+    return (
+        f"{site.lat.to_value(u.deg):.6f},"
+        f"{site.lon.to_value(u.deg):.6f},"
+        f"{site.height.to_value(u.m):.1f}"
+    )
+
+
+def _options_key(options) -> str:
+    return json.dumps(
+        {
+            name: value
+            for name, value in options.dict().items()
+            if name not in ALERT_DEPENDENT_OPTIONS
+        },
+        sort_keys=True,
+    )
+
+
+class WindowStore:
+    """SQLite backed store of the observable intervals of nights.
+
+    Args:
+        path (str): database file, created if needed.
+        coord_tolerance_deg (float): quantization of the source coordinates.
+    """
+
+    def __init__(
+        self, path: str, coord_tolerance_deg: float = DEFAULT_COORD_TOLERANCE_DEG
+    ):
+        self.path = path
+        self.coord_tolerance_deg = coord_tolerance_deg
+        self._connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_S, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def _position_key(self, site, ra_deg, dec_deg, options) -> tuple:
+        return (
+            _site_key(site),
+            round(ra_deg / self.coord_tolerance_deg),
+            round(dec_deg / self.coord_tolerance_deg),
+            _options_key(options),
+        )
+
+    def load(
+        self, site, ra_deg, dec_deg, options, nights: List[Night]
+    ) -> Dict[str, IntervalSet]:
+        """stored intervals of the nights, by evening date (ISO format)."""
+        site_key, ra_q, dec_q, options_key = self._position_key(
+            site, ra_deg, dec_deg, options
+        )
+        dates = [night.evening_date.isoformat() for night in nights]
+        if not dates:
+            return {}
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT evening_date, starts, ends FROM night_intervals "
+                "WHERE site = ? AND ra_q = ? AND dec_q = ? AND options = ? "
+                f"AND evening_date IN ({', '.join('?' * len(dates))})",
+                (site_key, ra_q, dec_q, options_key, *dates),
+            ).fetchall()
+
+        return {
+            evening_date: IntervalSet(
+                np.frombuffer(starts, dtype="<f8"), np.frombuffer(ends, dtype="<f8")
+            )
+            for evening_date, starts, ends in rows
+        }
+
+    def save(self, site, ra_deg, dec_deg, options, intervals: Dict[str, IntervalSet]):
+        site_key, ra_q, dec_q, options_key = self._position_key(
+            site, ra_deg, dec_deg, options
+        )
+        rows = [
+            (
+                site_key,
+                ra_q,
+                dec_q,
+                evening_date,
+                options_key,
+                night_intervals.starts.astype("<f8").tobytes(),
+                night_intervals.ends.astype("<f8").tobytes(),
+            )
+            for evening_date, night_intervals in intervals.items()
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO night_intervals VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+class MemoryWindowStore:
+    """WindowStore interface on the in-memory (LRU, TTL) task cache.
+
+    Args:
+        cache (TaskResultCache, optional): defaults to the process wide cache,
+            its coord_tolerance_deg quantizes the source coordinates.
+    """
+
+    def __init__(self, cache: Optional[task_cache.TaskResultCache] = None):
+        self.cache = cache
+
+    def _cache(self) -> task_cache.TaskResultCache:
+        return self.cache if self.cache is not None else task_cache.task_result_cache
+
+    def _key(self, cache, site, ra_deg, dec_deg, options, evening_date) -> tuple:
+        return (
+            "night_intervals",
+            _site_key(site),
+            round(ra_deg / cache.coord_tolerance_deg),
+            round(dec_deg / cache.coord_tolerance_deg),
+            _options_key(options),
+            evening_date,
+        )
+
+    def load(
+        self, site, ra_deg, dec_deg, options, nights: List[Night]
+    ) -> Dict[str, IntervalSet]:
+        cache = self._cache()
+        stored = {}
+        for night in nights:
+            evening_date = night.evening_date.isoformat()
+            intervals = cache.get(
+                self._key(cache, site, ra_deg, dec_deg, options, evening_date)
+            )
+            if intervals is not None:
+                stored[evening_date] = intervals
+        return stored
+
+    def save(self, site, ra_deg, dec_deg, options, intervals: Dict[str, IntervalSet]):
+        cache = self._cache()
+        for evening_date, night_intervals in intervals.items():
+            cache.put(
+                self._key(cache, site, ra_deg, dec_deg, options, evening_date),
+                night_intervals,
+            )
+
+
+_stores: Dict[Tuple[str, int], WindowStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_window_store(path: str) -> WindowStore:
+    """one connection per store and process (connections do not survive fork)."""
+    key = (os.path.abspath(path), os.getpid())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = WindowStore(path)
+        return _stores[key]
+
+
+@timed_stage("compute_night_intervals")
+def compute_night_intervals(
+    ra_deg, dec_deg, options, site, nights: List[Night]
+) -> Dict[str, IntervalSet]:
+    """site and source constraint intervals of each night, without the alert cut."""
+    night_grids = [setup_night_timerange(night, options) for night in nights]
+    nonempty = [(n, grid) for n, grid in zip(nights, night_grids) if len(grid)]
+    intervals = {night.evening_date.isoformat(): IntervalSet() for night in nights}
+    if not nonempty:
+        return intervals
+
+    mjds = np.concatenate([grid for _, grid in nonempty])
+    night_ids = np.repeat(np.arange(len(nonempty)), [len(g) for _, g in nonempty])
+    masks = position_constraint_masks(ra_deg, dec_deg, options, site, mjds)
+    all_intervals = intersection(
+        *[IntervalSet.from_mask(mjds, mask, night_ids) for mask in masks.values()]
+    )
+
+    for night, grid in nonempty:
+        in_night = (all_intervals.starts >= grid[0]) & (all_intervals.ends <= grid[-1])
+        intervals[night.evening_date.isoformat()] = IntervalSet(
+            all_intervals.starts[in_night], all_intervals.ends[in_night]
+        )
+    return intervals
+
+
+def calculate_observation_windows_stored(
+    science_alert,
+    options,
+    site,
+    nights: List[Night],
+    store: Union[WindowStore, MemoryWindowStore],
+) -> List[ObservationWindow]:
+    """calculate_observation_windows, with the night intervals from the store.
+
+    Nights missing in the store are computed (all at once) and saved. The
+    coordinates are quantized to the tolerance of the store, the windows are
+    the same as calculate_observation_windows returns for the first alert of a
+    position.
+    """
+    ra_deg = science_alert.coords.raInDeg
+    dec_deg = science_alert.coords.decInDeg
+
+    stored = store.load(site, ra_deg, dec_deg, options, nights)
+    missing = [n for n in nights if n.evening_date.isoformat() not in stored]
+    if missing:
+        computed = compute_night_intervals(ra_deg, dec_deg, options, site, missing)
+        store.save(site, ra_deg, dec_deg, options, computed)
+        stored.update(computed)
+
+    night_grids = [setup_night_timerange(night, options) for night in nights]
+    grid_mjds = np.concatenate([[]] + night_grids)
+    alert_mjd = datetime_to_mjd(science_alert.alert_time)
+    first_after_alert = np.searchsorted(grid_mjds, alert_mjd, side="right")
+    if first_after_alert == len(grid_mjds):
+        return []
+
+    night_intervals = [stored[night.evening_date.isoformat()] for night in nights]
+    intervals = intersection(
+        IntervalSet(
+            np.concatenate([[]] + [n.starts for n in night_intervals]),
+            np.concatenate([[]] + [n.ends for n in night_intervals]),
+        ),
+        IntervalSet([grid_mjds[first_after_alert]], [grid_mjds[-1]]),
+    )
+    return windows_from_intervals(science_alert, options, intervals)